@@ -0,0 +1,79 @@
+import argparse
+import logging
+import os
+import time
+from collections.abc import Callable
+from typing import TextIO, cast
+from chessbot import logs
+from chessbot.arguments import LogLevel
+
+# Measures the time the calling thread spends logging for each handled comment,
+# comparing eager f-strings written synchronously with lazy arguments queued to a
+# listener thread. With a write delay the sink stands in for a pipe or terminal
+# that is slow to drain.
+
+_COMMENT = "e4 e5 Nf3"
+
+
+class SlowStream:
+    _stream: TextIO
+    _delay: float
+
+    def __init__(self, stream: TextIO, delay: float) -> None:
+        self._stream = stream
+        self._delay = delay
+
+    def write(self, text: str) -> int:
+        if self._delay:
+            time.sleep(self._delay)
+        return self._stream.write(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def eager(channel: str, id: str, body: str) -> None:
+    logging.info(f"Handling comment {id} in {channel}: {body}")
+    logging.debug(f"Parsed {body} for {id}")
+
+
+def lazy(channel: str, id: str, body: str) -> None:
+    logging.info(
+        "Handling comment: %s", body, extra={"channel": channel, "comment": id}
+    )
+    logging.debug("Parsed %s", body, extra={"channel": channel, "comment": id})
+
+
+def per_comment_us(log: Callable[[str, str, str], None], comments: int) -> float:
+    start = time.perf_counter()
+    for i in range(comments):
+        log("chess", f"c{i}", _COMMENT)
+    return (time.perf_counter() - start) / comments * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--write-delay-us", type=float, default=0)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    with open(os.devnull, "w") as devnull:
+        stream = cast(TextIO, SlowStream(devnull, args.write_delay_us / 1e6))
+        for level in [LogLevel.INFO, LogLevel.WARN]:
+            handler = logging.StreamHandler(stream)
+            root.addHandler(handler)
+            root.setLevel(str(level).upper())
+            synchronous = per_comment_us(eager, args.comments)
+            root.removeHandler(handler)
+
+            with logs.configured(level, stream):
+                queued = per_comment_us(lazy, args.comments)
+            print(
+                f"{level:>5}: {synchronous:6.2f} us per comment synchronous, "
+                f"{queued:6.2f} us queued"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import chess
+from chessbot import database
+from chessbot.database import Database, NeedsInitialPost
+from chessbot.moves import MoveNormal
+from chessbot.outcome import Outcome
+
+# Compares the on-disk size and per-game load time of row and packed move storage
+# over a synthetic archive of random games.
+
+
+def random_game(rng: random.Random, max_plies: int) -> list[MoveNormal]:
+    board = chess.Board()
+    moves: list[MoveNormal] = []
+    while len(moves) < max_plies and not board.is_game_over():
+        move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        moves.append(MoveNormal(move, rng.random() < 0.02))
+    return moves
+
+
+def build(path: str, games: list[list[MoveNormal]], packed: bool) -> Database:
+    match database.open(path, reset=True, packed_moves=packed):
+        case NeedsInitialPost(db):
+            db.insert_post("initial")
+        case Database() as db:
+            pass
+    db._execute("PRAGMA synchronous = OFF")
+    for i, moves in enumerate(games):
+        for ply, move in enumerate(moves):
+            db.play_move(move, f"{i}_{ply}", commit=False)
+        db.new_game(f"{i}_final", Outcome.DRAW, f"{i + 1}_initial")
+    db._execute("VACUUM")
+    return db
+
+
+def load_seconds(db: Database, game_count: int) -> float:
+    start = time.perf_counter()
+    for game in range(1, game_count + 1):
+        db.moves(game)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--plies", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = [random_game(rng, args.plies) for _ in range(args.games)]
+    plies = sum(len(moves) for moves in games)
+    print(f"{len(games)} games, {plies} plies")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for packed in [False, True]:
+            path = os.path.join(directory, f"{packed}.db")
+            db = build(path, games, packed)
+            seconds = load_seconds(db, len(games))
+            label = "packed" if packed else "row"
+            print(
+                f"{label:>6}: {os.path.getsize(path) / 1024:9.1f} KiB, "
+                f"{seconds * 1000:8.1f} ms to load every game "
+                f"({seconds / len(games) * 1e6:.1f} us per game)"
+            )
+
+
+if __name__ == "__main__":
+    main()
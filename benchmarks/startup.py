@@ -0,0 +1,137 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from chessbot import database
+from chessbot.database import Database, NeedsInitialPost
+
+# Measures cold start costs in fresh interpreters and exits with an error when any
+# of them goes over its budget:
+#  - `-X importtime` cumulative time for the CLI entry point and chessbot.moves
+#  - wall time from process start until handle_messages has answered a first
+#    comment, against the replay stand-in for Reddit and an existing database
+
+_FIRST_COMMENT = """
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from chessbot import database
+from chessbot.bot import handle_messages
+from chessbot.messages import IncomingComment, MsgQueue
+from chessbot.ratelimit import RequestScheduler
+from chessbot.replay import ReplayReddit
+
+
+async def main() -> None:
+    reddit = ReplayReddit("chess", [], {})
+    queue: MsgQueue = asyncio.Queue()
+    queue.put_nowait(IncomingComment("b", "chess", "alice", "e4 draw", 0.0))
+    with ThreadPoolExecutor(1) as renderer:
+        handler = asyncio.create_task(
+            handle_messages(
+                reddit,
+                reddit,
+                queue,
+                database.connect(sys.argv[1]),
+                "chess",
+                RequestScheduler(),
+                renderer,
+            )
+        )
+        await queue.join()
+        handler.cancel()
+        await asyncio.gather(handler, return_exceptions=True)
+    assert "b" in reddit.replies
+
+
+asyncio.run(main())
+"""
+
+
+def import_ms(module: str) -> float:
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time:  self [us] | cumulative | name", with nested
+    # imports indented beneath the module that triggered them
+    total = 0
+    counting = False
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        counting = counting or name.strip().startswith("chessbot")
+        if counting and not name.startswith("  "):
+            total += int(cumulative)
+    return total / 1000
+
+
+def first_comment_ms(template: str) -> float:
+    # Answering records a checkpoint, so every run starts from a fresh copy
+    with tempfile.TemporaryDirectory() as directory:
+        path = shutil.copy(template, os.path.join(directory, "startup.db"))
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", _FIRST_COMMENT, path], check=True)
+        return (time.perf_counter() - start) * 1000
+
+
+def create_database(path: str) -> None:
+    # An existing game, so that startup does not need to render an initial post
+    match database.connect(path).for_channel("chess"):
+        case NeedsInitialPost(db):
+            db.insert_post("a")
+        case Database():
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cli-budget-ms", type=float, default=100)
+    parser.add_argument("--moves-budget-ms", type=float, default=250)
+    parser.add_argument("--first-comment-budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    template = os.path.join(directory.name, "template.db")
+    create_database(template)
+
+    measurements: list[tuple[str, float, Callable[[], float]]] = [
+        ("import chessbot", args.cli_budget_ms, lambda: import_ms("chessbot")),
+        (
+            "import chessbot.moves",
+            args.moves_budget_ms,
+            lambda: import_ms("chessbot.moves"),
+        ),
+        (
+            "first comment",
+            args.first_comment_budget_ms,
+            lambda: first_comment_ms(template),
+        ),
+    ]
+
+    failed = False
+    for label, budget, measure in measurements:
+        median = statistics.median(measure() for _ in range(args.runs))
+        over = median > budget
+        failed = failed or over
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{label:>22}: {median:8.1f} ms (budget {budget:.0f} ms) {status}")
+
+    directory.cleanup()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
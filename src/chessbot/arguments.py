@@ -1,5 +1,6 @@
 from __future__ import annotations
 import argparse
+import sys
 from enum import StrEnum, auto
 from typing import NamedTuple
 from chessbot.schedule import Schedule, ScheduleTimeout, ScheduleUtc
@@ -18,17 +19,42 @@ class AuthMethod(StrEnum):
     ENV = auto()
 
 
+class Channel(NamedTuple):
+    subreddit: str
+    schedule: Schedule
+
+    # Database rows and comment routing are keyed by the lowercase name
+    def key(self) -> str:
+        return self.subreddit.lower()
+
+
 class Arguments(NamedTuple):
     log: LogLevel
-    schedule: Schedule
+    channels: list[Channel]
     database: str
     auth_method: AuthMethod
-    subreddit: str
     reset: bool
+    packed_moves: bool
+    workers: int
+    capture: str | None
+    author_rate: float
+    author_burst: float
+    lead_time: float
+    early_close: int | None
+    memory_limit: int | None
+    memory_trace: int
+    memory_dumps: str
+    status_port: int | None
 
     @staticmethod
     def parse() -> Arguments:
-        parser = argparse.ArgumentParser(prog="CommunityChess Server")
+        parser = argparse.ArgumentParser(
+            prog="CommunityChess Server",
+            epilog="Run 'chessbot export --help' to archive finished games as PGN, "
+            "'chessbot index --help' to build the position search index, "
+            "'chessbot stats --help' to summarize past games "
+            "or 'chessbot replay --help' to rerun a capture",
+        )
 
         parser.add_argument(
             "-l",
@@ -79,9 +105,11 @@ class Arguments(NamedTuple):
             "-s",
             "--subreddit",
             type=str,
+            action="append",
             required=True,
-            metavar="NAME",
-            help="The subreddit to make posts in",
+            metavar="NAME[:utc=TIMES|:timeout=SECONDS]",
+            help="A subreddit to run a game in, optionally with its own schedule. "
+            "Repeat to run several games. Existing data belongs to the first one.",
         )
 
         parser.add_argument(
@@ -91,6 +119,95 @@ class Arguments(NamedTuple):
             help="Whether to completely reset the database",
         )
 
+        parser.add_argument(
+            "--packed-moves",
+            action="store_true",
+            help="Migrate the database to compact binary move storage",
+        )
+
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=0,
+            metavar="COUNT",
+            help="Stream comments in a separate process and parse them in COUNT worker processes",
+        )
+
+        parser.add_argument(
+            "--capture",
+            type=str,
+            metavar="PATH",
+            help="Record comments, schedule ticks and Reddit responses to PATH "
+            "for 'chessbot replay'",
+        )
+
+        parser.add_argument(
+            "--author-rate",
+            type=float,
+            default=2.0,
+            metavar="COMMENTS",
+            help="Answer at most COMMENTS move comments per minute from each author "
+            "once their burst is spent",
+        )
+
+        parser.add_argument(
+            "--author-burst",
+            type=float,
+            default=5.0,
+            metavar="COMMENTS",
+            help="How many move comments an author can post at once before "
+            "the rest are ignored",
+        )
+
+        parser.add_argument(
+            "--lead-time",
+            type=float,
+            default=5.0,
+            metavar="SECONDS",
+            help="Count votes and render the next post SECONDS before it is due",
+        )
+
+        parser.add_argument(
+            "--early-close",
+            type=int,
+            metavar="VOTES",
+            help="Play a move before it is due once it leads every other move "
+            "by VOTES points",
+        )
+
+        parser.add_argument(
+            "--memory-limit",
+            type=int,
+            metavar="MB",
+            help="Record what is using memory and drop caches when resident "
+            "memory crosses MB",
+        )
+
+        parser.add_argument(
+            "--memory-trace",
+            type=int,
+            default=0,
+            metavar="FRAMES",
+            help="Trace allocations with FRAMES of stack for --memory-limit reports, "
+            "at some cost to speed and memory",
+        )
+
+        parser.add_argument(
+            "--memory-dumps",
+            type=str,
+            default=".",
+            metavar="DIR",
+            help="The directory to write --memory-limit reports to",
+        )
+
+        parser.add_argument(
+            "--status-port",
+            type=int,
+            metavar="PORT",
+            help="Serve the current games read-only on localhost:PORT",
+        )
+
         args = parser.parse_args()
 
         match (
@@ -101,6 +218,17 @@ class Arguments(NamedTuple):
             args.auth_method,
             args.subreddit,
             args.reset,
+            args.packed_moves,
+            args.workers,
+            args.capture,
+            args.author_rate,
+            args.author_burst,
+            args.lead_time,
+            args.early_close,
+            args.memory_limit,
+            args.memory_trace,
+            args.memory_dumps,
+            args.status_port,
         ):
             case (
                 str() as log,
@@ -108,21 +236,225 @@ class Arguments(NamedTuple):
                 (int() | None) as utc,
                 str() as database,
                 str() as auth_method,
-                str() as subreddit,
+                list() as subreddits,
                 bool() as reset,
+                bool() as packed_moves,
+                int() as workers,
+                (str() | None) as capture,
+                float() as author_rate,
+                float() as author_burst,
+                float() as lead_time,
+                (int() | None) as early_close,
+                (int() | None) as memory_limit,
+                int() as memory_trace,
+                str() as memory_dumps,
+                (int() | None) as status_port,
             ):
                 return Arguments(
                     LogLevel(log),
-                    _schedule(utc, timeout),
+                    [_channel(str(spec), utc, timeout) for spec in subreddits],
                     database,
                     AuthMethod(auth_method),
-                    subreddit,
                     reset,
+                    packed_moves,
+                    workers,
+                    capture,
+                    author_rate,
+                    author_burst,
+                    lead_time,
+                    early_close,
+                    memory_limit,
+                    memory_trace,
+                    memory_dumps,
+                    status_port,
                 )
             case _:
                 raise Exception("Invalid program arguments")
 
 
+class ExportArguments(NamedTuple):
+    database: str
+    output: str | None
+    page_size: int
+
+    @staticmethod
+    def parse(argv: list[str]) -> ExportArguments:
+        parser = argparse.ArgumentParser(
+            prog="chessbot export",
+            description="Write every finished game to a PGN archive",
+        )
+
+        parser.add_argument(
+            "-d",
+            "--database",
+            type=str,
+            default="communitychess.db",
+            metavar="PATH",
+            help="The file to use for the sqlite database",
+        )
+
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=str,
+            metavar="PATH",
+            help="The file to write PGN to, standard output by default",
+        )
+
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            metavar="ROWS",
+            help="How many rows to read from the database at a time",
+        )
+
+        args = parser.parse_args(argv)
+
+        match (args.database, args.output, args.page_size):
+            case (str() as database, (str() | None) as output, int() as page_size):
+                return ExportArguments(database, output, page_size)
+            case _:
+                raise Exception("Invalid program arguments")
+
+
+class IndexArguments(NamedTuple):
+    database: str
+    games: int
+
+    @staticmethod
+    def parse(argv: list[str]) -> IndexArguments:
+        parser = argparse.ArgumentParser(
+            prog="chessbot index",
+            description="Add games from before the position index existed to it. "
+            "Safe to interrupt and to run alongside the bot.",
+        )
+
+        parser.add_argument(
+            "-d",
+            "--database",
+            type=str,
+            default="communitychess.db",
+            metavar="PATH",
+            help="The file to use for the sqlite database",
+        )
+
+        parser.add_argument(
+            "-g",
+            "--games",
+            type=int,
+            default=100,
+            metavar="COUNT",
+            help="How many games to index between progress reports",
+        )
+
+        args = parser.parse_args(argv)
+
+        match (args.database, args.games):
+            case (str() as database, int() as games):
+                return IndexArguments(database, games)
+            case _:
+                raise Exception("Invalid program arguments")
+
+
+class StatsArguments(NamedTuple):
+    database: str
+    rebuild: bool
+
+    @staticmethod
+    def parse(argv: list[str]) -> StatsArguments:
+        parser = argparse.ArgumentParser(
+            prog="chessbot stats",
+            description="Summarize outcomes, game lengths and draw offers",
+        )
+
+        parser.add_argument(
+            "-d",
+            "--database",
+            type=str,
+            default="communitychess.db",
+            metavar="PATH",
+            help="The file to use for the sqlite database",
+        )
+
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recount the summary from every stored game first",
+        )
+
+        args = parser.parse_args(argv)
+
+        match (args.database, args.rebuild):
+            case (str() as database, bool() as rebuild):
+                return StatsArguments(database, rebuild)
+            case _:
+                raise Exception("Invalid program arguments")
+
+
+class ReplayArguments(NamedTuple):
+    capture: str
+    log: LogLevel
+
+    @staticmethod
+    def parse(argv: list[str]) -> ReplayArguments:
+        parser = argparse.ArgumentParser(
+            prog="chessbot replay",
+            description="Feed a file recorded with --capture through the bot "
+            "against a stand-in for Reddit and report the time spent on each stage",
+        )
+
+        parser.add_argument("capture", type=str, metavar="PATH")
+
+        parser.add_argument(
+            "-l",
+            "--log",
+            type=str,
+            choices=["debug", "info", "warn", "error", "critical"],
+            default="warn",
+            metavar="LEVEL",
+            help="Sets the logging verbosity level",
+        )
+
+        args = parser.parse_args(argv)
+
+        match (args.capture, args.log):
+            case (str() as capture, str() as log):
+                return ReplayArguments(capture, LogLevel(log))
+            case _:
+                raise Exception("Invalid program arguments")
+
+
+def parse() -> (
+    Arguments | ExportArguments | IndexArguments | StatsArguments | ReplayArguments
+):
+    match sys.argv[1:2]:
+        case ["export"]:
+            return ExportArguments.parse(sys.argv[2:])
+        case ["index"]:
+            return IndexArguments.parse(sys.argv[2:])
+        case ["stats"]:
+            return StatsArguments.parse(sys.argv[2:])
+        case ["replay"]:
+            return ReplayArguments.parse(sys.argv[2:])
+        case _:
+            return Arguments.parse()
+
+
+def _channel(spec: str, utc: int | None, timeout: int | None) -> Channel:
+    subreddit, _, schedule = spec.partition(":")
+    match schedule.partition("="):
+        case ("", "", ""):
+            return Channel(subreddit, _schedule(utc, timeout))
+        case ("utc", "=", times) if times.isdigit():
+            return Channel(subreddit, ScheduleUtc(int(times)))
+        case ("timeout", "=", seconds) if seconds.isdigit():
+            return Channel(subreddit, ScheduleTimeout(int(seconds)))
+        case _:
+            print(f"Invalid schedule '{schedule}' for subreddit {subreddit}")
+            exit(1)
+
+
 def _schedule(utc: int | None, timeout: int | None) -> Schedule:
     match (utc, timeout):
         case (int() as utc, None):
@@ -0,0 +1,970 @@
+from chessbot.arguments import Arguments, AuthMethod
+from chessbot.player import Player
+from chessbot.schedule import Schedule
+from .moves import (
+    Move,
+    MoveDraw,
+    MoveError,
+    MoveNormal,
+    MoveResign,
+    Spellings,
+    move_for_comment,
+)
+from chessbot.outcome import Outcome, for_move as outcome_for_move
+from chessbot.messages import (
+    IncomingComment,
+    MsgQueue,
+    NotifyFlushOutbox,
+    NotifyPlayMove,
+    ParsedComment,
+)
+from chessbot.ratelimit import (
+    INGESTION_SHARE,
+    AuthorLimiter,
+    Priority,
+    RequestScheduler,
+    jittered_backoff,
+    reddit_rate_limit,
+)
+
+from . import capture, database, logs, status
+from .database import (
+    CommentCheckpoint,
+    Database,
+    NeedsInitialPost,
+    OutboxPost,
+    RenderedPost,
+    Vote,
+)
+
+from asyncpraw.exceptions import RedditAPIException
+from asyncpraw.reddit import Reddit
+from asyncpraw.models.reddit.subreddit import Subreddit
+from asyncpraw.models.reddit.submission import Submission
+from asyncpraw.models.reddit.comment import Comment
+from asyncpraw.models.util import stream_generator
+from asyncprawcore.exceptions import AsyncPrawcoreException
+
+from chess import Board
+
+import os
+import tempfile
+import time
+import tracemalloc
+import asyncio
+import logging
+from asyncio import CancelledError, Future, Queue
+from datetime import UTC, datetime
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Final, assert_never
+
+_OUTBOX_BACKOFF_BASE: Final = 5.0
+_OUTBOX_BACKOFF_CAP: Final = 15 * 60.0
+_EARLY_CLOSE_INTERVAL: Final = 5 * 60.0
+_CATCH_UP_PAGE_SIZE: Final = 100
+
+# Keeps background parses alive until their results are queued
+_parse_tasks: set[asyncio.Task[None]] = set()
+
+
+class MakePostException(Exception):
+    def __init__(self) -> None:
+        super().__init__("Failed to make a post")
+
+
+def run(args: Arguments) -> None:
+    if args.capture is not None:
+        capture.start(args.capture)
+    if args.memory_trace > 0:
+        tracemalloc.start(args.memory_trace)
+    try:
+        with logs.configured(args.log):
+            asyncio.run(async_main(args))
+    finally:
+        capture.stop()
+
+
+def connect(args: Arguments) -> Reddit:
+    match args.auth_method:
+        case AuthMethod.PRAW:
+            return Reddit()
+        case AuthMethod.ENV:
+            return Reddit(
+                client_id=os.environ["CLIENT_ID"],
+                client_secret=os.environ["CLIENT_SECRET"],
+                refresh_token=os.environ["REFRESH_TOKEN"],
+                user_agent=os.environ["USER_AGENT"],
+            )
+
+
+async def async_main(args: Arguments) -> None:
+    logging.info("Entering async_main")
+
+    reddit = connect(args)
+    try:
+        subreddits = [
+            await reddit.subreddit(channel.subreddit) for channel in args.channels
+        ]
+        combined = await reddit.subreddit(
+            "+".join(channel.subreddit for channel in args.channels)
+        )
+    except CancelledError:
+        logging.info("Cancelling forward_comments")
+        return
+
+    # Channels share the Reddit client, its rate limit, the rendering thread and
+    # the database file, but each has its own queue and schedule
+    scheduler = RequestScheduler(
+        reddit_rate_limit(reddit),
+        share=1.0 if args.workers == 0 else 1.0 - INGESTION_SHARE,
+    )
+    renderer = ThreadPoolExecutor(1)
+    shared_database = database.connect(
+        args.database, reset=args.reset, packed_moves=args.packed_moves
+    )
+    queues: dict[str, MsgQueue] = {channel.key(): Queue() for channel in args.channels}
+
+    # Flood control runs here so that dropped comments are never parsed, whether
+    # parsing happens in this process or in the worker pool
+    authors = AuthorLimiter(args.author_rate / 60, args.author_burst)
+
+    async def route(comment: IncomingComment) -> None:
+        queue = queues.get(comment.subreddit)
+        if queue is not None and not flooding(authors, comment):
+            await queue.put(comment)
+
+    workers = None
+    if args.workers > 0:
+        # Imported here so that single-process mode never loads multiprocessing
+        from chessbot.workers import Workers
+
+        workers = Workers(args)
+
+    watchdog = None
+    if args.memory_limit is not None:
+        from chessbot.watchdog import Watchdog
+
+        watchdog = Watchdog(
+            args.memory_limit * 1024 * 1024,
+            args.memory_dumps,
+            [shared_database.release_memory],
+        )
+
+    if args.status_port is not None:
+        status.start()
+
+    tasks = []
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(
+                    forward_comments(combined, route, scheduler)
+                    if workers is None
+                    else workers.receive(route)
+                )
+            ]
+            if watchdog is not None:
+                tasks.append(group.create_task(watchdog.run()))
+            if args.status_port is not None:
+                tasks.append(group.create_task(status.serve(args.status_port)))
+            for channel, subreddit in zip(args.channels, subreddits):
+                queue = queues[channel.key()]
+                tasks += [
+                    group.create_task(
+                        send_play_move_notifications(
+                            queue, channel.schedule, args.lead_time, args.early_close
+                        )
+                    ),
+                    group.create_task(
+                        handle_messages(
+                            reddit,
+                            subreddit,
+                            queue,
+                            shared_database,
+                            channel.key(),
+                            scheduler,
+                            renderer,
+                            None if workers is None else workers.parser,
+                            authors,
+                        )
+                    ),
+                ]
+    except CancelledError:
+        for task in tasks:
+            task.cancel()
+        await reddit.close()
+    finally:
+        logging.info("Author flood control: %s", authors.summary())
+        status.stop()
+        renderer.shutdown()
+        if workers is not None:
+            workers.close()
+
+
+async def handle_messages(
+    reddit: Reddit,
+    subreddit: Subreddit,
+    queue: MsgQueue,
+    shared_database: Database,
+    channel: str,
+    scheduler: RequestScheduler,
+    renderer: Executor,
+    parser: Executor | None = None,
+    authors: AuthorLimiter | None = None,
+) -> None:
+    logging.info("Entered handle_messages for %s", channel)
+    board = Board()
+
+    try:
+        database = await open_database(
+            shared_database, channel, subreddit, scheduler, renderer
+        )
+    except MakePostException:
+        raise Exception("Failed to make initial post")
+
+    for move in database.moves():
+        board.push(move.move)
+    capture.record(
+        "start",
+        channel=channel,
+        moves=[[move.move.uci(), move.offer_draw] for move in database.moves()],
+        post=database.previous_post(),
+    )
+
+    # The board stays on the position Reddit is showing until a pending post is
+    # made, so comments on the current post are answered against it
+    if database.outbox() is not None:
+        queue.put_nowait(NotifyFlushOutbox())
+    spellings = database.spellings(board)
+    publish_status(database, board)
+    if status.enabled():
+        rendered = await render(
+            renderer, board, Outcome.ONGOING, was_draw_offered(database)
+        )
+        status.publish_png(channel, rendered.png)
+
+    # Comments from the live stream queue up while the backlog is answered
+    try:
+        await catch_up_comments(
+            reddit, subreddit, scheduler, board, spellings, database, authors
+        )
+    except CancelledError:
+        return
+
+    while True:
+        try:
+            msg = await queue.get()
+        except CancelledError:
+            break
+
+        # Lets callers wait for a burst of messages to be handled with join
+        started = time.perf_counter()
+        try:
+            match msg:
+                case NotifyPlayMove() as tick:
+                    capture.record(
+                        "tick", channel=channel, early_margin=tick.early_margin
+                    )
+                    played = False
+                    try:
+                        played = await play_move(
+                            reddit,
+                            subreddit,
+                            board,
+                            database,
+                            scheduler,
+                            renderer,
+                            queue,
+                            tick.deadline,
+                            tick.early_margin,
+                        )
+                    except CancelledError:
+                        break
+                    finally:
+                        if tick.played is not None and not tick.played.done():
+                            tick.played.set_result(played)
+                    spellings = database.spellings(board)
+                    logging.info("Reddit request metrics: %s", scheduler.summary())
+
+                case NotifyFlushOutbox():
+                    try:
+                        await flush_outbox(
+                            reddit, subreddit, board, database, scheduler, queue
+                        )
+                    except CancelledError:
+                        break
+                    spellings = database.spellings(board)
+
+                case IncomingComment() as comment:
+                    capture.record("comment", comment=comment._asdict())
+                    if parser is None:
+                        try:
+                            await answer_comments(
+                                reddit, [comment], scheduler, board, spellings, database
+                            )
+                        except CancelledError:
+                            break
+                    else:
+                        parse_in_background(parser, queue, comment, board.fen())
+
+                case ParsedComment() as parsed:
+                    if parsed.fen != board.fen():
+                        parse_in_background(parser, queue, parsed.comment, board.fen())
+                        continue
+                    try:
+                        await answer_parsed(
+                            reddit, parsed.comment, parsed.move, scheduler, database
+                        )
+                    except CancelledError:
+                        break
+
+        finally:
+            queue.task_done()
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(
+                    "Handled message",
+                    extra={
+                        "channel": channel,
+                        "stage": type(msg).__name__,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    },
+                )
+
+
+async def open_database(
+    shared_database: Database,
+    channel: str,
+    subreddit: Subreddit,
+    scheduler: RequestScheduler,
+    renderer: Executor,
+) -> Database:
+    opened = shared_database.for_channel(channel)
+    match opened:
+        case Database() as db:
+            return db
+        case NeedsInitialPost(db):
+            post = await make_post(
+                subreddit, scheduler, renderer, Board(), Outcome.ONGOING, False
+            )
+            db.insert_post(post.id)
+            return db
+        case _:
+            assert_never(opened)
+
+
+async def forward_comments(
+    subreddit: Subreddit,
+    send: Callable[[IncomingComment], Awaitable[None]],
+    scheduler: RequestScheduler,
+) -> None:
+    logging.info("Entered forward_comments")
+    comments = scheduler.listing(Priority.READ, subreddit.comments)
+    async for comment in stream_generator(comments, skip_existing=True):
+        if is_move_comment(comment):
+            incoming = incoming_comment(comment)
+            logging.info(
+                "Sending comment",
+                extra={"channel": incoming.subreddit, "comment": incoming.id},
+            )
+            try:
+                await send(incoming)
+            except CancelledError:
+                break
+
+
+async def catch_up_comments(
+    reddit: Reddit,
+    subreddit: Subreddit,
+    scheduler: RequestScheduler,
+    board: Board,
+    spellings: Spellings,
+    database: Database,
+    authors: AuthorLimiter | None = None,
+) -> None:
+    checkpoint = database.comment_checkpoint()
+    if checkpoint is None:
+        return
+
+    # Listings are newest first, so page backwards until reaching the checkpoint
+    backlog: list[IncomingComment] = []
+    comments = scheduler.listing(Priority.READ, subreddit.comments)
+    after: str | None = None
+    reached = False
+    while not reached:
+        page = [
+            comment
+            async for comment in comments(
+                limit=_CATCH_UP_PAGE_SIZE, params={"after": after}
+            )
+        ]
+        for comment in page:
+            if comment.created_utc < checkpoint.created:
+                reached = True
+                break
+            if is_move_comment(comment):
+                backlog.append(incoming_comment(comment))
+        if len(page) < _CATCH_UP_PAGE_SIZE:
+            break
+        after = page[-1].fullname
+
+    backlog.reverse()
+    if authors is not None:
+        backlog = [comment for comment in backlog if not flooding(authors, comment)]
+    logging.info(
+        "Catching up on %d comments since %s", len(backlog), checkpoint.fullname
+    )
+    # Recorded as inputs like live comments, so that replay sends their replies
+    for comment in backlog:
+        capture.record("comment", comment=comment._asdict())
+    for start in range(0, len(backlog), _CATCH_UP_PAGE_SIZE):
+        await answer_comments(
+            reddit,
+            backlog[start : start + _CATCH_UP_PAGE_SIZE],
+            scheduler,
+            board,
+            spellings,
+            database,
+        )
+
+
+async def answer_comments(
+    reddit: Reddit,
+    comments: list[IncomingComment],
+    scheduler: RequestScheduler,
+    board: Board,
+    spellings: Spellings,
+    database: Database,
+) -> None:
+    answered = database.answered_comments([comment.fullname for comment in comments])
+    pending = [comment for comment in comments if comment.fullname not in answered]
+
+    # Identical comments are common in a backlog, so parse each body once
+    has_draw_offer = was_draw_offered(database)
+    replies: dict[str, str] = {}
+    for comment in pending:
+        if comment.body not in replies:
+            replies[comment.body] = reply_for_comment(
+                comment.body, board, has_draw_offer, spellings
+            )
+
+    await send_replies(
+        reddit,
+        [(comment, replies[comment.body]) for comment in pending],
+        scheduler,
+        database,
+    )
+
+
+async def answer_parsed(
+    reddit: Reddit,
+    comment: IncomingComment,
+    move: Move | MoveError | None,
+    scheduler: RequestScheduler,
+    database: Database,
+) -> None:
+    if len(database.answered_comments([comment.fullname])) > 0:
+        return
+    reply = reply_for_move(move, was_draw_offered(database))
+    await send_replies(reddit, [(comment, reply)], scheduler, database)
+
+
+async def send_replies(
+    reddit: Reddit,
+    replies: list[tuple[IncomingComment, str]],
+    scheduler: RequestScheduler,
+    database: Database,
+) -> None:
+    async def reply(comment: IncomingComment, text: str) -> None:
+        target = await reddit.comment(comment.id, fetch=False)
+        await scheduler.call(
+            Priority.REPLY, lambda: target.reply(text), idempotent=False
+        )
+
+    results = await asyncio.gather(
+        *(reply(comment, text) for comment, text in replies), return_exceptions=True
+    )
+
+    checkpoints: list[CommentCheckpoint] = []
+    for (comment, text), result in zip(replies, results):
+        match result:
+            case BaseException():
+                logging.error(
+                    "Failed to respond to comment %s: %s",
+                    comment.fullname,
+                    result,
+                    extra={"channel": comment.subreddit, "comment": comment.id},
+                )
+            case _:
+                capture.record(
+                    "reply", channel=comment.subreddit, comment=comment.id, text=text
+                )
+                checkpoints.append(
+                    CommentCheckpoint(comment.fullname, comment.created_utc)
+                )
+                logging.info(
+                    "Responded to comment '%s' with '%s'",
+                    comment.body,
+                    text,
+                    extra={"channel": comment.subreddit, "comment": comment.id},
+                )
+    database.answer_comments(checkpoints)
+
+
+def parse_in_background(
+    parser: Executor | None, queue: MsgQueue, comment: IncomingComment, fen: str
+) -> None:
+    assert parser is not None
+
+    async def parse() -> None:
+        move = await asyncio.get_running_loop().run_in_executor(
+            parser, move_for_position, comment.body, fen
+        )
+        await queue.put(ParsedComment(comment, fen, move))
+
+    task = asyncio.create_task(parse())
+    _parse_tasks.add(task)
+    task.add_done_callback(_parse_tasks.discard)
+
+
+def move_for_position(comment: str, fen: str) -> Move | MoveError | None:
+    return move_for_comment(comment, Board(fen))
+
+
+def flooding(authors: AuthorLimiter, comment: IncomingComment) -> bool:
+    if comment.author is None or authors.allow(comment.author):
+        return False
+    logging.debug(
+        "Suppressed comment from %s",
+        comment.author,
+        extra={"channel": comment.subreddit, "comment": comment.id},
+    )
+    return True
+
+
+def incoming_comment(comment: Comment) -> IncomingComment:
+    author = None if comment.author is None else comment.author.name
+    return IncomingComment(
+        comment.id,
+        comment.subreddit.display_name.lower(),
+        author,
+        comment.body,
+        comment.created_utc,
+    )
+
+
+def is_move_comment(comment: Comment) -> bool:
+    TOP_LEVEL_COMMENT_PREFIX = "t3_"
+    is_top_level = comment.parent_id[:3] == TOP_LEVEL_COMMENT_PREFIX
+    return is_top_level and not comment.is_submitter
+
+
+async def send_play_move_notifications(
+    queue: MsgQueue, schedule: Schedule, lead_time: float, early_margin: int | None
+) -> None:
+    logging.info("Entered send_play_move_notifications")
+    deadline = None
+    while True:
+        now = time.monotonic()
+        deadline = schedule.next_deadline(deadline, now, datetime.now(UTC))
+        if deadline <= now:
+            # Rather than playing every missed move back to back after a stall
+            logging.warning("Missed a post deadline by %.1f seconds", now - deadline)
+            deadline = schedule.next_deadline(None, now, datetime.now(UTC))
+        logging.info("Next post scheduled in %.1f seconds", deadline - now)
+
+        try:
+            if await close_early(queue, deadline - lead_time, early_margin):
+                continue
+            await asyncio.sleep(deadline - lead_time - time.monotonic())
+            logging.info("Sending play move notification")
+            await queue.put(NotifyPlayMove(deadline))
+        except CancelledError:
+            break
+
+
+# Periodically asks the handler to play the move ahead of time, which it only does
+# once the vote is decided
+async def close_early(queue: MsgQueue, until: float, margin: int | None) -> bool:
+    if margin is None:
+        return False
+    while time.monotonic() + _EARLY_CLOSE_INTERVAL < until:
+        await asyncio.sleep(_EARLY_CLOSE_INTERVAL)
+        played: Future[bool] = asyncio.get_running_loop().create_future()
+        await queue.put(NotifyPlayMove(None, margin, played))
+        if await played:
+            logging.info("Closed voting early")
+            return True
+    return False
+
+
+def reply_for_comment(
+    comment: str,
+    board: Board,
+    has_draw_offer: bool,
+    spellings: Spellings | None = None,
+) -> str:
+    return reply_for_move(move_for_comment(comment, board, spellings), has_draw_offer)
+
+
+def reply_for_move(res: Move | MoveError | None, has_draw_offer: bool) -> str:
+    match res:
+        case MoveNormal(move, draw_offer):
+            if draw_offer:
+                return f"I found the move {move} with a draw offer in your comment."
+            else:
+                return f"I found the move {move} in your comment."
+        case MoveResign():
+            return "I found the suggestion to resign in your comment."
+        case MoveDraw():
+            if has_draw_offer:
+                return "I found the suggestion to accept a draw"
+            else:
+                return "Since the opponent hasn't offered a draw, I need you to also offer a move in case they don't accept."
+        case None:
+            return "I did not find a valid move in your comment. Make sure to put valid SAN or UCI notation in the first line to suggest a move."
+        case MoveError():
+            return f"The move {res.move_text} is {res.kind}."
+
+
+async def play_move(
+    reddit: Reddit,
+    subreddit: Subreddit,
+    board: Board,
+    database: Database,
+    scheduler: RequestScheduler,
+    renderer: Executor,
+    queue: MsgQueue,
+    deadline: float | None = None,
+    early_margin: int | None = None,
+) -> bool:
+    if database.outbox() is not None:
+        logging.warning("Skipping move while a previous post is pending")
+        return False
+
+    last_post = await scheduler.call(
+        Priority.POST, lambda: reddit.submission(database.previous_post())
+    )
+    assert isinstance(last_post, Submission)
+    move, votes = await select_move(board, database.spellings(board), last_post)
+    status.publish_votes(database.channel, last_post.id, votes)
+    if early_margin is not None and vote_margin(votes) < early_margin:
+        return False
+    database.record_votes(votes)
+    logging.info("Playing move %s", move, extra={"post": last_post.id})
+
+    # Posts prepared during the lead time wait in the outbox until the deadline
+    next_attempt = (
+        0.0 if deadline is None else time.time() + deadline - time.monotonic()
+    )
+    match move:
+        case None:
+            return False
+
+        case MoveNormal():
+            # Played on a copy, the move only reaches the board once it is posted
+            played = board.copy()
+            played.push(move.move)
+            outcome = outcome_for_move(move, played, database.moves())
+            match outcome:
+                case Outcome.ONGOING:
+                    posts = [
+                        await render(renderer, played, Outcome.ONGOING, move.offer_draw)
+                    ]
+
+                case (
+                    Outcome.DRAW
+                    | Outcome.STALEMATE
+                    | Outcome.VICTORY_WHITE
+                    | Outcome.VICTORY_BLACK
+                ):
+                    posts = await new_game_posts(renderer, played, outcome)
+
+                case Outcome.RESIGNATION_WHITE | Outcome.RESIGNATION_BLACK:
+                    raise Exception("Unreachable")
+
+            database.enqueue_outbox(move, outcome, posts, next_attempt)
+
+        case MoveDraw():
+            posts = await new_game_posts(renderer, board, Outcome.DRAW)
+            database.enqueue_outbox(None, Outcome.DRAW, posts, next_attempt)
+
+        case MoveResign():
+            outcome = Player.to_play(board.ply()).resignation()
+            posts = await new_game_posts(renderer, board, outcome)
+            database.enqueue_outbox(None, outcome, posts, next_attempt)
+
+    await flush_outbox(reddit, subreddit, board, database, scheduler, queue)
+    return True
+
+
+async def flush_outbox(
+    reddit: Reddit,
+    subreddit: Subreddit,
+    board: Board,
+    database: Database,
+    scheduler: RequestScheduler,
+    queue: MsgQueue,
+) -> None:
+    entry = database.outbox()
+    if entry is None:
+        return
+
+    now = time.time()
+    if entry.next_attempt > now:
+        asyncio.get_running_loop().call_later(
+            entry.next_attempt - now, queue.put_nowait, NotifyFlushOutbox()
+        )
+        return
+
+    try:
+        for post in entry.posts:
+            if post.reddit_id is None:
+                submission = await submit_post(subreddit, scheduler, post.post)
+                database.outbox_submitted(post.id, submission.id)
+                post = post._replace(reddit_id=submission.id)
+            if not post.replied:
+                await reply_to_post(reddit, scheduler, post)
+                database.outbox_replied(post.id)
+    # API errors such as RATELIMIT are reported in the response body rather than
+    # by asyncprawcore
+    except (MakePostException, AsyncPrawcoreException, RedditAPIException) as e:
+        delay = jittered_backoff(
+            entry.attempts, _OUTBOX_BACKOFF_BASE, _OUTBOX_BACKOFF_CAP
+        )
+        logging.error(
+            "Failed to post outbox entry %d, retrying in %.0f seconds: %s",
+            entry.id,
+            delay,
+            e,
+        )
+        database.outbox_failed(entry.id, time.time() + delay)
+        asyncio.get_running_loop().call_later(
+            delay, queue.put_nowait, NotifyFlushOutbox()
+        )
+        return
+
+    completed = database.outbox()
+    assert completed is not None
+    if entry.outcome != Outcome.ONGOING:
+        board.reset()
+    elif entry.move is not None:
+        board.push(entry.move.move)
+    database.complete_outbox(completed, board)
+    publish_status(database, board)
+    status.publish_png(database.channel, entry.posts[-1].post.png)
+    if entry.attempts == 0 and entry.next_attempt > 0:
+        logging.info(
+            "Posted outbox entry %d %.2f seconds after its deadline",
+            entry.id,
+            time.time() - entry.next_attempt,
+        )
+    else:
+        logging.info("Posted outbox entry %d", entry.id)
+
+
+def publish_status(database: Database, board: Board) -> None:
+    if status.enabled():
+        status.publish_board(
+            database.channel,
+            board.fen(),
+            board_pgn(board),
+            board.ply(),
+            database.previous_post(),
+        )
+
+
+async def new_game_posts(
+    renderer: Executor, board: Board, outcome: Outcome
+) -> list[RenderedPost]:
+    return [
+        await render(renderer, board, outcome, False),
+        await render(renderer, Board(), Outcome.ONGOING, False),
+    ]
+
+
+async def select_move(
+    board: Board, spellings: Spellings, post: Submission
+) -> tuple[Move | None, list[Vote]]:
+    top_score = 0
+    selected = None
+    votes: list[Vote] = []
+    seen: list[dict[str, Any]] = []
+    async for comment in post.comments:
+        if capture.enabled():
+            seen.append(captured_comment(comment))
+        if comment.is_submitter:
+            continue
+        move = move_for_comment(comment.body, board, spellings)
+        votes.append(vote_for_comment(post, comment, move))
+        if comment.score <= top_score:
+            continue
+        match move:
+            case MoveNormal() | MoveResign() | MoveDraw():
+                selected = move
+                top_score = comment.score
+            case None | MoveError():
+                pass
+    capture.record("votes", post=post.id, comments=seen)
+    return selected, votes
+
+
+# How far the leading move is ahead of the best comment for any other move
+def vote_margin(votes: list[Vote]) -> int:
+    best: dict[str, int] = {}
+    for vote in votes:
+        if vote.move is not None and vote.error is None:
+            best[vote.move] = max(best.get(vote.move, vote.score), vote.score)
+    first, second, *_ = sorted([*best.values(), 0, 0], reverse=True)
+    return first - second
+
+
+def captured_comment(comment: Comment) -> dict[str, Any]:
+    return {
+        "id": comment.id,
+        "author": None if comment.author is None else comment.author.name,
+        "body": comment.body,
+        "score": comment.score,
+        "is_submitter": comment.is_submitter,
+    }
+
+
+def vote_for_comment(
+    post: Submission, comment: Comment, move: Move | MoveError | None
+) -> Vote:
+    author = None if comment.author is None else comment.author.name
+    vote = Vote(post.id, comment.id, author, None, False, None, comment.score)
+    match move:
+        case MoveNormal():
+            return vote._replace(move=move.move.uci(), draw_offer=move.offer_draw)
+        case MoveDraw():
+            return vote._replace(move="draw")
+        case MoveResign():
+            return vote._replace(move="resign")
+        case MoveError():
+            return vote._replace(move=move.move_text, error=move.kind)
+        case None:
+            return vote
+
+
+async def make_post(
+    subreddit: Subreddit,
+    scheduler: RequestScheduler,
+    renderer: Executor,
+    board: Board,
+    outcome: Outcome,
+    draw_offer: bool,
+) -> Submission:
+    rendered = await render(renderer, board, outcome, draw_offer)
+    post = await submit_post(subreddit, scheduler, rendered)
+    await scheduler.call(
+        Priority.POST, lambda: post.reply(rendered.reply), idempotent=False
+    )
+    return post
+
+
+# Rendering is CPU bound, so it runs on a thread shared by every channel to keep
+# the event loop responsive
+async def render(
+    renderer: Executor, board: Board, outcome: Outcome, draw_offer: bool
+) -> RenderedPost:
+    return await asyncio.get_running_loop().run_in_executor(
+        renderer, render_post, board.copy(), outcome, draw_offer
+    )
+
+
+def render_post(board: Board, outcome: Outcome, draw_offer: bool) -> RenderedPost:
+    # Rendering dependencies are slow to import and unused until the first post
+    import cairosvg
+    import chess.svg
+
+    svg = chess.svg.board(board, size=1024)
+    png = cairosvg.svg2png(svg)
+    title = title_for_outcome(outcome, board.ply(), draw_offer)
+    reply = f"PGN:\n\n{board_pgn(board)}\n\nFEN:\n\n{board.fen()}"
+    return RenderedPost(title, png, reply)
+
+
+async def submit_post(
+    subreddit: Subreddit, scheduler: RequestScheduler, rendered: RenderedPost
+) -> Submission:
+    fd, path = tempfile.mkstemp(".png")
+    with os.fdopen(fd, "wb") as file:
+        file.write(rendered.png)
+    try:
+        post = await scheduler.call(
+            Priority.POST,
+            lambda: subreddit.submit_image(rendered.title, path),
+            idempotent=False,
+        )
+    finally:
+        os.remove(path)
+    match post:
+        case Submission():
+            capture.record(
+                "post",
+                channel=subreddit.display_name.lower(),
+                id=post.id,
+                title=rendered.title,
+            )
+            return post
+        case None:
+            raise MakePostException()
+        case _:
+            assert_never(post)
+
+
+async def reply_to_post(
+    reddit: Reddit, scheduler: RequestScheduler, post: OutboxPost
+) -> None:
+    assert post.reddit_id is not None
+    submission = await reddit.submission(post.reddit_id, fetch=False)
+    await scheduler.call(
+        Priority.POST, lambda: submission.reply(post.post.reply), idempotent=False
+    )
+
+
+def title_for_outcome(outcome: Outcome, half_moves: int, is_draw_offered: bool) -> str:
+    match outcome:
+        case Outcome.ONGOING:
+            to_play = Player.to_play(half_moves)
+            draw_offer = (
+                f", {to_play.opponent()} offers a draw" if is_draw_offered else ""
+            )
+            return f"Move {move_number(half_moves)}, {to_play} to play{draw_offer}"
+        case Outcome.VICTORY_WHITE:
+            return "White checkmate"
+        case Outcome.VICTORY_BLACK:
+            return "Black checkmate"
+        case Outcome.STALEMATE:
+            return "Stalemate"
+        case Outcome.DRAW:
+            return "Draw"
+        case Outcome.RESIGNATION_WHITE:
+            return "White resigns"
+        case Outcome.RESIGNATION_BLACK:
+            return "Black resigns"
+
+
+def board_pgn(board: Board) -> str:
+    import chess.pgn
+
+    game = chess.pgn.Game()
+    node = game.root()
+    for move in board.move_stack:
+        node = node.add_main_variation(move)
+    printer = chess.pgn.StringExporter(headers=False, variations=False, comments=False)
+    pgn = game.accept(printer)
+    match pgn:
+        case str():
+            return pgn
+        case _:
+            raise Exception("Expected a string")
+
+
+def move_number(half_moves: int) -> int:
+    return half_moves // 2 + 1
+
+
+def was_draw_offered(database: Database) -> bool:
+    return database.moves().offered_draw()
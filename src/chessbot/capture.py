@@ -0,0 +1,34 @@
+import json
+import time
+from typing import Any, TextIO
+
+# Records what the bot observes from Reddit and what it sends back, one JSON
+# object per line, so that `chessbot replay` can feed the same inputs through the
+# message handler offline. Recording is off unless a capture file is started.
+
+_file: TextIO | None = None
+_started = 0.0
+
+
+def start(path: str) -> None:
+    global _file, _started
+    _file = open(path, "a", encoding="utf-8", buffering=1)
+    _started = time.monotonic()
+
+
+def stop() -> None:
+    global _file
+    if _file is not None:
+        _file.close()
+        _file = None
+
+
+def enabled() -> bool:
+    return _file is not None
+
+
+def record(event: str, **fields: Any) -> None:
+    if _file is None:
+        return
+    line = {"event": event, "time": round(time.monotonic() - _started, 3), **fields}
+    _file.write(json.dumps(line, separators=(",", ":")) + "\n")
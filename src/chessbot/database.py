@@ -1,11 +1,17 @@
+from __future__ import annotations
 import sqlite3
 from sqlite3.dbapi2 import Connection, Cursor
 
 import os
 import chess
-from typing import NamedTuple
-from chessbot.outcome import Outcome
-from chessbot.moves import MoveNormal
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Final, NamedTuple
+from chessbot.outcome import Outcome, result
+from chessbot.moves import MoveErrorKind, MoveNormal, Spellings, legal_spellings
+from chessbot.history import History
+from chessbot.packed import position_hash
 
 
 class ResponseFormatException(Exception):
@@ -18,14 +24,91 @@ class NoRowsException(Exception):
         super().__init__("Database response contains no rows")
 
 
-SqlData = str | int | float | None
+SqlData = str | int | float | bytes | None
+
+PAGE_SIZE: Final = 100
+SPELLING_CACHE_SIZE: Final = 1000
+# Raised when a summary table is added, so that existing databases recount
+STATS_VERSION: Final = "2"
+
+
+class RenderedPost(NamedTuple):
+    title: str
+    png: bytes
+    reply: str
+
+
+class OutboxPost(NamedTuple):
+    id: int
+    post: RenderedPost
+    reddit_id: str | None
+    replied: bool
+
+
+class CommentCheckpoint(NamedTuple):
+    fullname: str
+    created: float
+
+
+class GameRecord(NamedTuple):
+    id: int
+    channel: str
+    outcome: Outcome
+
+
+class PositionMatch(NamedTuple):
+    game: int
+    ply: int
+    post: str | None
+
+
+class Stats(NamedTuple):
+    moves: int
+    draw_offers: int
+    outcomes: dict[Outcome, int]
+    lengths: dict[int, int]
+    # Number of posts by how many votes were counted on them
+    votes: dict[int, int]
+
+
+# A comment on a post as it was parsed and scored when a move was selected. The
+# move is UCI, draw or resign, or the rejected text when there is an error.
+class Vote(NamedTuple):
+    post: str
+    comment: str
+    author: str | None
+    move: str | None
+    draw_offer: bool
+    error: MoveErrorKind | None
+    score: int
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    move: MoveNormal | None
+    outcome: Outcome
+    attempts: int
+    next_attempt: float
+    posts: list[OutboxPost]
 
 
 class Database:
     _connection: Connection
+    _channel: str
+    _packed: bool
+    _current: History | None
 
-    def __init__(self, connection: Connection) -> None:
+    def __init__(
+        self, connection: Connection, channel: str = "", packed: bool = False
+    ) -> None:
         self._connection = connection
+        self._channel = channel
+        self._packed = packed
+        self._current = None
+
+    @property
+    def channel(self) -> str:
+        return self._channel
 
     def _execute(self, sql: str, *parameters: SqlData) -> Cursor:
         return self._connection.execute(sql, parameters)
@@ -33,6 +116,12 @@ class Database:
     def _commit(self) -> None:
         self._connection.commit()
 
+    # Hands the connection's page cache back under memory pressure. The cached
+    # games are left alone, since they are small and dropping them would only
+    # make the next move replay the whole game.
+    def release_memory(self) -> None:
+        self._execute("PRAGMA shrink_memory")
+
     def insert_post(self, reddit_id: str, commit: bool = True) -> None:
         self._execute(
             """
@@ -42,10 +131,12 @@ class Database:
                 (
                     SELECT MAX(id) 
                     FROM game
+                    WHERE channel = ?
                 )
             )
             """,
             reddit_id,
+            self._channel,
         )
         if commit:
             self._commit()
@@ -55,7 +146,10 @@ class Database:
         previous_game_final_post: str,
         previous_game_outcome: Outcome,
         new_game_initial_post: str,
+        commit: bool = True,
     ) -> None:
+        self._count("stat_outcome", int(previous_game_outcome))
+        self._count("stat_length", len(self.moves()))
         self.insert_post(previous_game_final_post, commit=False)
         self._execute(
             """
@@ -65,18 +159,24 @@ class Database:
             WHERE id = (
                 SELECT MAX(id) 
                 FROM game
+                WHERE channel = ?
             )
             """,
             int(previous_game_outcome),
             previous_game_final_post,
+            self._channel,
         )
         self._execute(
             """
-            INSERT INTO game DEFAULT VALUES
-            """
+            INSERT INTO game(channel)
+            VALUES (?)
+            """,
+            self._channel,
         )
         self.insert_post(new_game_initial_post, commit=False)
-        self._commit()
+        self._current = History()
+        if commit:
+            self._commit()
 
     def previous_post(self) -> str:
         res = self._execute(
@@ -86,10 +186,12 @@ class Database:
             WHERE game = (
                 SELECT MAX(id) 
                 FROM game
+                WHERE channel = ?
             )
             ORDER BY id DESC 
             LIMIT 1
-            """
+            """,
+            self._channel,
         )
         match res.fetchone():
             case (str() as id,):
@@ -99,11 +201,30 @@ class Database:
             case _:
                 raise ResponseFormatException()
 
+    # The board is the position after the move, which callers that keep one pass
+    # to save replaying the game
     def play_move(
         self,
         move: MoveNormal,
         next_post: str,
+        commit: bool = True,
+        board: chess.Board | None = None,
     ) -> None:
+        history = self.moves()
+        if self._packed:
+            self._play_move_packed(history, move)
+        else:
+            self._play_move_row(move)
+        history.append(move)
+        self._count("stat_total", "moves")
+        if move.offer_draw:
+            self._count("stat_total", "draw_offers")
+        self.insert_post(next_post, commit=False)
+        self._index_position(len(history), _board(history) if board is None else board)
+        if commit:
+            self._commit()
+
+    def _play_move_row(self, move: MoveNormal) -> None:
         self._execute(
             """
             INSERT INTO move(uci, draw_offer, post) 
@@ -116,29 +237,490 @@ class Database:
                     WHERE post.game = (
                         SELECT MAX(id) 
                         FROM game
+                        WHERE channel = ?
                     )
                 )
             )
             """,
             move.move.uci(),
             int(move.offer_draw),
+            self._channel,
         )
-        self.insert_post(next_post, commit=False)
+
+    def _play_move_packed(self, history: History, move: MoveNormal) -> None:
+        appended = History.from_packed(*history.packed())
+        appended.append(move)
+        codes, draw_offers = appended.packed()
+        self._execute(
+            """
+            INSERT INTO packed_move(game, codes, draw_offers)
+            VALUES (
+                (
+                    SELECT MAX(id)
+                    FROM game
+                    WHERE channel = ?
+                ),
+                ?,
+                ?
+            )
+            ON CONFLICT(game) DO UPDATE
+            SET codes       = excluded.codes,
+                draw_offers = excluded.draw_offers
+            """,
+            self._channel,
+            codes,
+            draw_offers,
+        )
+
+    def _index_position(self, ply: int, board: chess.Board) -> None:
+        self._execute(
+            """
+            INSERT OR IGNORE INTO position(hash, game, ply, post)
+            SELECT ?, game.id, ?, MAX(post.id)
+            FROM game
+            INNER JOIN post
+            ON post.game = game.id
+            WHERE game.id = (
+                SELECT MAX(id)
+                FROM game
+                WHERE channel = ?
+            )
+            """,
+            position_hash(board),
+            ply,
+            self._channel,
+        )
+
+    def find_position(self, fen: str) -> list[PositionMatch]:
+        out: list[PositionMatch] = []
+        for row in self._execute(
+            """
+            SELECT position.game, position.ply, post.reddit_id
+            FROM position
+            LEFT JOIN post
+            ON post.id = position.post
+            WHERE position.hash = ?
+            ORDER BY position.game, position.ply
+            """,
+            position_hash(chess.Board(fen)),
+        ):
+            match row:
+                case (int() as game, int() as ply, (str() | None) as post):
+                    out.append(PositionMatch(game, ply, post))
+                case _:
+                    raise ResponseFormatException()
+        return out
+
+    def backfill_positions(self, games: int = PAGE_SIZE) -> int:
+        # Each game is indexed in the same transaction that records it as done,
+        # so an interrupted backfill resumes after the last complete game
+        after = int(self._setting("position_index") or 0)
+        count = 0
+        for game in self.iter_games(after=after, page_size=games):
+            board = chess.Board()
+            rows: list[tuple[SqlData, ...]] = []
+            for ply, move in enumerate(self.iter_moves(game.id), 1):
+                board.push(move.move)
+                rows.append((position_hash(board), game.id, ply, game.id, ply))
+            self._connection.executemany(
+                """
+                INSERT OR IGNORE INTO position(hash, game, ply, post)
+                VALUES (
+                    ?,
+                    ?,
+                    ?,
+                    (
+                        SELECT id
+                        FROM post
+                        WHERE game = ?
+                        ORDER BY id
+                        LIMIT 1
+                        OFFSET ?
+                    )
+                )
+                """,
+                rows,
+            )
+            self._set_setting("position_index", str(game.id))
+            self._commit()
+            count += 1
+            if count == games:
+                break
+        return count
+
+    def spellings(
+        self, board: chess.Board, limit: int = SPELLING_CACHE_SIZE
+    ) -> Spellings:
+        # Games keep revisiting the same openings, so parse results are kept
+        # across games and restarts for the most recently used positions
+        hash = position_hash(board)
+        touched = self._execute(
+            """
+            UPDATE spelling_position
+            SET used = (
+                SELECT MAX(used) + 1
+                FROM spelling_position
+            )
+            WHERE hash = ?
+            """,
+            hash,
+        )
+        if touched.rowcount == 1:
+            self._commit()
+            return self._cached_spellings(hash)
+
+        spellings = legal_spellings(board)
+        self._execute(
+            """
+            INSERT INTO spelling_position(hash, used)
+            SELECT ?, COALESCE(MAX(used), 0) + 1
+            FROM spelling_position
+            """,
+            hash,
+        )
+        self._connection.executemany(
+            """
+            INSERT INTO spelling(hash, text, result)
+            VALUES (?, ?, ?)
+            """,
+            [(hash, text, result) for text, result in spellings.items()],
+        )
+        self._execute(
+            """
+            DELETE FROM spelling
+            WHERE hash IN (
+                SELECT hash
+                FROM spelling_position
+                ORDER BY used DESC
+                LIMIT -1
+                OFFSET ?
+            )
+            """,
+            limit,
+        )
+        self._execute(
+            """
+            DELETE FROM spelling_position
+            WHERE hash IN (
+                SELECT hash
+                FROM spelling_position
+                ORDER BY used DESC
+                LIMIT -1
+                OFFSET ?
+            )
+            """,
+            limit,
+        )
+        self._commit()
+        return spellings
+
+    def _cached_spellings(self, hash: int) -> Spellings:
+        out: Spellings = {}
+        for row in self._execute(
+            """
+            SELECT text, result
+            FROM spelling
+            WHERE hash = ?
+            """,
+            hash,
+        ):
+            match row:
+                case (str() as text, str() as result):
+                    out[text] = result
+                case _:
+                    raise ResponseFormatException()
+        return out
+
+    def _count(self, table: str, key: SqlData, amount: int = 1) -> None:
+        self._execute(
+            f"""
+            INSERT INTO {table}(key, value)
+            VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE
+            SET value = value + excluded.value
+            """,
+            key,
+            amount,
+        )
+
+    def stats(self) -> Stats:
+        stats = Stats(0, 0, {}, {}, {})
+        for row in self._execute(
+            """
+            SELECT 'total', key, value
+            FROM stat_total
+            UNION ALL
+            SELECT 'outcome', key, value
+            FROM stat_outcome
+            UNION ALL
+            SELECT 'length', key, value
+            FROM stat_length
+            UNION ALL
+            SELECT 'votes', votes, posts
+            FROM stat_votes
+            """
+        ):
+            match row:
+                case ("total", "moves", int() as moves):
+                    stats = stats._replace(moves=moves)
+                case ("total", "draw_offers", int() as draw_offers):
+                    stats = stats._replace(draw_offers=draw_offers)
+                case ("outcome", int() as outcome, int() as games):
+                    stats.outcomes[Outcome(outcome)] = games
+                case ("length", int() as plies, int() as games):
+                    stats.lengths[plies] = games
+                case ("votes", int() as votes, int() as posts):
+                    stats.votes[votes] = posts
+                case _:
+                    raise ResponseFormatException()
+        return stats
+
+    def rebuild_stats(self) -> None:
+        # Recounts everything in one write transaction so that moves played
+        # meanwhile are neither lost nor counted twice
+        self._execute("BEGIN IMMEDIATE")
+        lengths: Counter[int] = Counter()
+        outcomes: Counter[int] = Counter()
+        moves = 0
+        draw_offers = 0
+        for outcome, plies, offers in self._game_counts():
+            moves += plies
+            draw_offers += offers
+            if outcome != Outcome.ONGOING:
+                lengths[plies] += 1
+                outcomes[outcome] += 1
+
+        for table in ["stat_total", "stat_outcome", "stat_length", "stat_votes"]:
+            self._execute(f"DELETE FROM {table}")
+        counts: list[tuple[str, Iterable[tuple[SqlData, int]]]] = [
+            ("stat_total", [("moves", moves), ("draw_offers", draw_offers)]),
+            ("stat_outcome", outcomes.items()),
+            ("stat_length", lengths.items()),
+        ]
+        for table, rows in counts:
+            self._connection.executemany(
+                f"""
+                INSERT INTO {table}(key, value)
+                VALUES (?, ?)
+                """,
+                rows,
+            )
+        self._execute(
+            """
+            INSERT INTO stat_votes(votes, posts)
+            SELECT votes, COUNT(*)
+            FROM (
+                SELECT COUNT(*) AS votes
+                FROM vote
+                GROUP BY post
+            )
+            GROUP BY votes
+            """
+        )
+        self._set_setting("stats", STATS_VERSION)
         self._commit()
 
-    def moves(self) -> list[MoveNormal]:
-        out: list[MoveNormal] = []
+    def _game_counts(self) -> Iterator[tuple[Outcome, int, int]]:
+        # Every game's plies and draw offers in a single query, counted from the
+        # stored form without building moves
+        if self._packed:
+            for row in self._execute(
+                """
+                SELECT game.outcome, COALESCE(LENGTH(codes) / 2, 0), draw_offers
+                FROM game
+                LEFT JOIN packed_move
+                ON packed_move.game = game.id
+                """
+            ):
+                match row:
+                    case (int() as outcome, int() as plies, None):
+                        yield Outcome(outcome), plies, 0
+                    case (int() as outcome, int() as plies, bytes() as bitset):
+                        offers = int.from_bytes(bitset, "little").bit_count()
+                        yield Outcome(outcome), plies, offers
+                    case _:
+                        raise ResponseFormatException()
+            return
+
+        for row in self._execute(
+            """
+            SELECT game.outcome, COUNT(move.id), COALESCE(SUM(move.draw_offer), 0)
+            FROM game
+            LEFT JOIN post
+            ON post.game = game.id
+            LEFT JOIN move
+            ON move.post = post.id
+            GROUP BY game.id
+            """
+        ):
+            match row:
+                case (int() as outcome, int() as plies, int() as draw_offers):
+                    yield Outcome(outcome), plies, draw_offers
+                case _:
+                    raise ResponseFormatException()
+
+    def record_votes(self, votes: list[Vote]) -> None:
+        # Selection runs on every tick until a move is played, so later ticks
+        # update the scores recorded by earlier ones
+        before = {vote.post: self._post_votes(vote.post) for vote in votes}
+        self._connection.executemany(
+            """
+            INSERT INTO vote(post, comment, author, move, draw_offer, error, score)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(post, comment) DO UPDATE
+            SET move       = excluded.move,
+                draw_offer = excluded.draw_offer,
+                error      = excluded.error,
+                score      = excluded.score
+            """,
+            [
+                (
+                    vote.post,
+                    vote.comment,
+                    vote.author,
+                    vote.move,
+                    int(vote.draw_offer),
+                    None if vote.error is None else str(vote.error),
+                    vote.score,
+                )
+                for vote in votes
+            ],
+        )
+
+        # Each post whose count changed moves from its old bucket to the new one
+        for post, count in before.items():
+            after = self._post_votes(post)
+            if after != count:
+                self._count_post_votes(count, -1)
+                self._count_post_votes(after, 1)
+        self._execute(
+            """
+            DELETE FROM stat_votes
+            WHERE posts <= 0
+            """
+        )
+        self._commit()
+
+    def _post_votes(self, post: str) -> int:
+        res = self._execute(
+            """
+            SELECT COUNT(*)
+            FROM vote
+            WHERE post = ?
+            """,
+            post,
+        )
+        match res.fetchone():
+            case (int() as count,):
+                return count
+            case _:
+                raise ResponseFormatException()
+
+    def _count_post_votes(self, votes: int, posts: int) -> None:
+        if votes == 0:
+            return
+        self._execute(
+            """
+            INSERT INTO stat_votes(votes, posts)
+            VALUES (?, ?)
+            ON CONFLICT(votes) DO UPDATE
+            SET posts = posts + excluded.posts
+            """,
+            votes,
+            posts,
+        )
+
+    def votes(self, post: str) -> list[Vote]:
+        out: list[Vote] = []
+        for row in self._execute(
+            """
+            SELECT comment, author, move, draw_offer, error, score
+            FROM vote
+            WHERE post = ?
+            ORDER BY score DESC, id
+            """,
+            post,
+        ):
+            match row:
+                case (
+                    str() as comment,
+                    (str() | None) as author,
+                    (str() | None) as move,
+                    int() as draw_offer,
+                    (str() | None) as error,
+                    int() as score,
+                ):
+                    out.append(
+                        Vote(
+                            post,
+                            comment,
+                            author,
+                            move,
+                            draw_offer == 1,
+                            None if error is None else MoveErrorKind(error),
+                            score,
+                        )
+                    )
+                case _:
+                    raise ResponseFormatException()
+        return out
+
+    def _setting(self, name: str) -> str | None:
+        res = self._execute(
+            """
+            SELECT value
+            FROM setting
+            WHERE name = ?
+            """,
+            name,
+        )
+        match res.fetchone():
+            case (str() as value,):
+                return value
+            case None:
+                return None
+            case _:
+                raise ResponseFormatException()
+
+    def _set_setting(self, name: str, value: str) -> None:
+        self._execute(
+            """
+            INSERT OR REPLACE INTO setting(name, value)
+            VALUES (?, ?)
+            """,
+            name,
+            value,
+        )
+
+    def moves(self, game: int | None = None) -> History:
+        # Defaults to the current game, which is cached and must not be modified
+        if game is None and self._current is not None:
+            return self._current
+        history = self._moves_packed(game) if self._packed else self._moves_row(game)
+        if game is None:
+            self._current = history
+        return history
+
+    def _moves_row(self, game: int | None) -> History:
+        out = History()
         for row in self._execute(
             """
             SELECT uci, draw_offer 
             FROM move 
             INNER JOIN post
             ON post.id = move.post
-            WHERE post.game = (
-                SELECT MAX(id) 
-                FROM game
+            WHERE post.game = COALESCE(
+                ?,
+                (
+                    SELECT MAX(id) 
+                    FROM game
+                    WHERE channel = ?
+                )
             )
-            """
+            ORDER BY move.id
+            """,
+            game,
+            self._channel,
         ):
             match row:
                 case (str() as uci, int() as draw_offer):
@@ -147,12 +729,494 @@ class Database:
                     raise ResponseFormatException()
         return out
 
+    def _moves_packed(self, game: int | None) -> History:
+        res = self._execute(
+            """
+            SELECT codes, draw_offers
+            FROM packed_move
+            WHERE game = COALESCE(
+                ?,
+                (
+                    SELECT MAX(id)
+                    FROM game
+                    WHERE channel = ?
+                )
+            )
+            """,
+            game,
+            self._channel,
+        )
+        match res.fetchone():
+            case None:
+                return History()
+            case (bytes() as codes, bytes() as draw_offers):
+                return History.from_packed(codes, draw_offers)
+            case _:
+                raise ResponseFormatException()
+
+    def migrate_to_packed(self) -> None:
+        # Rewrites every game in one transaction so an interrupted migration
+        # leaves the row storage untouched
+        if self._packed:
+            return
+        games = self._execute(
+            """
+            SELECT id
+            FROM game
+            """
+        ).fetchall()
+        for row in games:
+            match row:
+                case (int() as game,):
+                    moves = self._moves_row(game)
+                    if len(moves) == 0:
+                        continue
+                    codes, draw_offers = moves.packed()
+                    self._execute(
+                        """
+                        INSERT INTO packed_move(game, codes, draw_offers)
+                        VALUES (?, ?, ?)
+                        """,
+                        game,
+                        codes,
+                        draw_offers,
+                    )
+                case _:
+                    raise ResponseFormatException()
+        self._execute(
+            """
+            DELETE FROM move
+            """
+        )
+        self._set_setting("packed_moves", "1")
+        self._commit()
+        self._packed = True
+
+    def iter_games(
+        self, after: int = 0, page_size: int = PAGE_SIZE
+    ) -> Iterator[GameRecord]:
+        # Keyset pagination holds a single page in memory and no read lock
+        # between pages, however large the tables grow
+        while True:
+            page = self._execute(
+                """
+                SELECT id, channel, outcome
+                FROM game
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                after,
+                page_size,
+            ).fetchall()
+            if len(page) == 0:
+                return
+            for row in page:
+                match row:
+                    case (int() as game, str() as channel, int() as outcome):
+                        yield GameRecord(game, channel, Outcome(outcome))
+                        after = game
+                    case _:
+                        raise ResponseFormatException()
+
+    def iter_posts(self, game: int, page_size: int = PAGE_SIZE) -> Iterator[str]:
+        after = 0
+        while True:
+            page = self._execute(
+                """
+                SELECT id, reddit_id
+                FROM post
+                WHERE game = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                game,
+                after,
+                page_size,
+            ).fetchall()
+            if len(page) == 0:
+                return
+            for row in page:
+                match row:
+                    case (int() as id, str() as reddit_id):
+                        yield reddit_id
+                        after = id
+                    case _:
+                        raise ResponseFormatException()
+
+    def iter_moves(self, game: int, page_size: int = PAGE_SIZE) -> Iterator[MoveNormal]:
+        # Packed games are a single row that is already compact
+        if self._packed:
+            yield from self._moves_packed(game)
+            return
+
+        after = 0
+        while True:
+            page = self._execute(
+                """
+                SELECT move.id, uci, draw_offer
+                FROM move
+                INNER JOIN post
+                ON post.id = move.post
+                WHERE post.game = ? AND move.id > ?
+                ORDER BY move.id
+                LIMIT ?
+                """,
+                game,
+                after,
+                page_size,
+            ).fetchall()
+            if len(page) == 0:
+                return
+            for row in page:
+                match row:
+                    case (int() as id, str() as uci, int() as draw_offer):
+                        yield MoveNormal(chess.Move.from_uci(uci), draw_offer == 1)
+                        after = id
+                    case _:
+                        raise ResponseFormatException()
+
+    def export_pgn(self, page_size: int = PAGE_SIZE) -> Iterator[str]:
+        for game in self.iter_games(page_size=page_size):
+            if game.outcome != Outcome.ONGOING:
+                yield _game_pgn(
+                    game,
+                    self.iter_posts(game.id, page_size),
+                    self.iter_moves(game.id, page_size),
+                )
+
+    def for_channel(self, channel: str) -> Database | NeedsInitialPost:
+        # Shares the connection, so every channel lives in the same file
+        database = Database(self._connection, channel, self._packed)
+
+        # Rows written before channels existed belong to whichever channel claims
+        # them first
+        if channel != "":
+            for table in ["game", "outbox", "comment_checkpoint"]:
+                database._execute(
+                    f"""
+                    UPDATE OR IGNORE {table}
+                    SET channel = ?
+                    WHERE channel = ''
+                    """,
+                    channel,
+                )
+
+        # Populate a game if none exists
+        res = database._execute(
+            """
+            SELECT MAX(id) 
+            FROM game
+            WHERE channel = ?
+            """,
+            channel,
+        )
+        match res.fetchone():
+            case (int(),):
+                pass
+            case (None,):
+                database._execute(
+                    """
+                    INSERT INTO game(channel)
+                    VALUES (?)
+                    """,
+                    channel,
+                )
+            case _:
+                raise ResponseFormatException()
+
+        database._commit()
+
+        res = database._execute(
+            """
+            SELECT MAX(post.id)
+            FROM post
+            INNER JOIN game
+            ON game.id = post.game
+            WHERE game.channel = ?
+            """,
+            channel,
+        )
+        match res.fetchone():
+            case (int(),):
+                return database
+            case (None,):
+                return NeedsInitialPost(database)
+            case _:
+                raise ResponseFormatException()
+
+    # Posting waits until `next_attempt` so that a move prepared ahead of its
+    # deadline lands on time
+    def enqueue_outbox(
+        self,
+        move: MoveNormal | None,
+        outcome: Outcome,
+        posts: list[RenderedPost],
+        next_attempt: float = 0,
+    ) -> None:
+        res = self._execute(
+            """
+            INSERT INTO outbox(channel, uci, draw_offer, outcome, next_attempt)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            self._channel,
+            None if move is None else move.move.uci(),
+            int(move is not None and move.offer_draw),
+            int(outcome),
+            next_attempt,
+        )
+        for post in posts:
+            self._execute(
+                """
+                INSERT INTO outbox_post(entry, title, png, reply)
+                VALUES (?, ?, ?, ?)
+                """,
+                res.lastrowid,
+                post.title,
+                post.png,
+                post.reply,
+            )
+        self._commit()
+
+    def outbox(self) -> OutboxEntry | None:
+        res = self._execute(
+            """
+            SELECT id, uci, draw_offer, outcome, attempts, next_attempt
+            FROM outbox
+            WHERE channel = ?
+            ORDER BY id
+            LIMIT 1
+            """,
+            self._channel,
+        )
+        match res.fetchone():
+            case None:
+                return None
+            case (
+                int() as id,
+                (str() | None) as uci,
+                int() as draw_offer,
+                int() as outcome,
+                int() as attempts,
+                (float() | int()) as next_attempt,
+            ):
+                move = (
+                    None
+                    if uci is None
+                    else MoveNormal(chess.Move.from_uci(uci), draw_offer == 1)
+                )
+                return OutboxEntry(
+                    id,
+                    move,
+                    Outcome(outcome),
+                    attempts,
+                    float(next_attempt),
+                    self._outbox_posts(id),
+                )
+            case _:
+                raise ResponseFormatException()
+
+    def _outbox_posts(self, entry: int) -> list[OutboxPost]:
+        out: list[OutboxPost] = []
+        for row in self._execute(
+            """
+            SELECT id, title, png, reply, reddit_id, replied
+            FROM outbox_post
+            WHERE entry = ?
+            ORDER BY id
+            """,
+            entry,
+        ):
+            match row:
+                case (
+                    int() as id,
+                    str() as title,
+                    bytes() as png,
+                    str() as reply,
+                    (str() | None) as reddit_id,
+                    int() as replied,
+                ):
+                    out.append(
+                        OutboxPost(
+                            id, RenderedPost(title, png, reply), reddit_id, replied == 1
+                        )
+                    )
+                case _:
+                    raise ResponseFormatException()
+        return out
+
+    def outbox_submitted(self, post: int, reddit_id: str) -> None:
+        self._execute(
+            """
+            UPDATE outbox_post
+            SET reddit_id = ?
+            WHERE id = ?
+            """,
+            reddit_id,
+            post,
+        )
+        self._commit()
+
+    def outbox_replied(self, post: int) -> None:
+        self._execute(
+            """
+            UPDATE outbox_post
+            SET replied = 1
+            WHERE id = ?
+            """,
+            post,
+        )
+        self._commit()
+
+    def outbox_failed(self, entry: int, next_attempt: float) -> None:
+        self._execute(
+            """
+            UPDATE outbox
+            SET attempts     = attempts + 1,
+                next_attempt = ?
+            WHERE id = ?
+            """,
+            next_attempt,
+            entry,
+        )
+        self._commit()
+
+    def complete_outbox(
+        self, entry: OutboxEntry, board: chess.Board | None = None
+    ) -> None:
+        # Committing the move and removing the entry in one transaction means a
+        # crash can never apply the same entry twice
+        reddit_ids: list[str] = []
+        for post in entry.posts:
+            match post.reddit_id:
+                case str() as reddit_id:
+                    reddit_ids.append(reddit_id)
+                case None:
+                    raise Exception("Outbox entry has unsubmitted posts")
+
+        match (entry.outcome, entry.move, reddit_ids):
+            case (Outcome.ONGOING, MoveNormal() as move, [next_post]):
+                self.play_move(move, next_post, commit=False, board=board)
+            case (Outcome.ONGOING, _, _):
+                raise Exception("Unexpected outbox entry for an ongoing game")
+            case (outcome, _, [final_post, first_post]):
+                self.new_game(final_post, outcome, first_post, commit=False)
+            case _:
+                raise Exception("Unexpected outbox entry for a finished game")
+
+        self._execute(
+            """
+            DELETE FROM outbox_post
+            WHERE entry = ?
+            """,
+            entry.id,
+        )
+        self._execute(
+            """
+            DELETE FROM outbox
+            WHERE id = ?
+            """,
+            entry.id,
+        )
+        self._commit()
+
+    def comment_checkpoint(self) -> CommentCheckpoint | None:
+        res = self._execute(
+            """
+            SELECT fullname, created
+            FROM comment_checkpoint
+            WHERE channel = ?
+            """,
+            self._channel,
+        )
+        match res.fetchone():
+            case None:
+                return None
+            case (str() as fullname, (float() | int()) as created):
+                return CommentCheckpoint(fullname, float(created))
+            case _:
+                raise ResponseFormatException()
+
+    def answered_comments(self, reddit_ids: list[str]) -> set[str]:
+        placeholders = ", ".join("?" * len(reddit_ids))
+        res = self._execute(
+            f"""
+            SELECT reddit_id
+            FROM answered_comment
+            WHERE reddit_id IN ({placeholders})
+            """,
+            *reddit_ids,
+        )
+        out: set[str] = set()
+        for row in res:
+            match row:
+                case (str() as reddit_id,):
+                    out.add(reddit_id)
+                case _:
+                    raise ResponseFormatException()
+        return out
+
+    def answer_comments(self, checkpoints: list[CommentCheckpoint]) -> None:
+        # The checkpoint only moves forward, so answering a backlog out of order
+        # cannot rewind it
+        for checkpoint in checkpoints:
+            self._execute(
+                """
+                INSERT OR IGNORE INTO answered_comment(reddit_id, created)
+                VALUES (?, ?)
+                """,
+                checkpoint.fullname,
+                checkpoint.created,
+            )
+            self._execute(
+                """
+                INSERT INTO comment_checkpoint(channel, fullname, created)
+                VALUES (?, ?, ?)
+                ON CONFLICT(channel) DO UPDATE
+                SET fullname = excluded.fullname,
+                    created  = excluded.created
+                WHERE excluded.created >= comment_checkpoint.created
+                """,
+                self._channel,
+                checkpoint.fullname,
+                checkpoint.created,
+            )
+
+        # Catching up only looks at comments from every channel's checkpoint on,
+        # so older answers are never checked again. Comments from the same second
+        # as a checkpoint are still listed and keep their rows.
+        self._execute(
+            """
+            DELETE FROM answered_comment
+            WHERE created < (
+                SELECT MIN(created)
+                FROM comment_checkpoint
+            )
+            """
+        )
+        self._commit()
+
 
 class NeedsInitialPost(NamedTuple):
     database: Database
 
 
-def open(path: str, reset: bool = False) -> Database | NeedsInitialPost:
+def open(
+    path: str, reset: bool = False, packed_moves: bool = False, channel: str = ""
+) -> Database | NeedsInitialPost:
+    return connect(path, reset, packed_moves).for_channel(channel)
+
+
+# For tooling that reads alongside a running bot. Reads never take a write lock,
+# and the schema must already have been created by connect.
+def open_readonly(path: str) -> Database:
+    uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+    database = Database(sqlite3.connect(uri, uri=True))
+    database._packed = database._setting("packed_moves") == "1"
+    return database
+
+
+def connect(path: str, reset: bool = False, packed_moves: bool = False) -> Database:
     if reset:
         try:
             os.remove(path)
@@ -167,11 +1231,27 @@ def open(path: str, reset: bool = False) -> Database | NeedsInitialPost:
             id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
             outcome INTEGER CHECK(outcome >= 1 AND outcome <= 7) DEFAULT 1 NOT NULL,
             final_post INTEGER,
+            channel TEXT DEFAULT '' NOT NULL,
             FOREIGN KEY(final_post) REFERENCES post(id)
         )
         """
     )
 
+    if not _has_column(database, "game", "channel"):
+        database._execute(
+            """
+            ALTER TABLE game
+            ADD COLUMN channel TEXT DEFAULT '' NOT NULL
+            """
+        )
+
+    database._execute(
+        """
+        CREATE INDEX IF NOT EXISTS game_channel
+        ON game(channel, id)
+        """
+    )
+
     database._execute(
         """
         CREATE TABLE IF NOT EXISTS move(
@@ -195,37 +1275,301 @@ def open(path: str, reset: bool = False) -> Database | NeedsInitialPost:
         """
     )
 
-    # Populate a game if none exists
-    res = database._execute(
+    database._execute(
         """
-        SELECT MAX(id) 
-        FROM game
+        CREATE INDEX IF NOT EXISTS post_game
+        ON post(game, id)
         """
     )
-    match res.fetchone():
-        case (int(),):
-            pass
-        case (None,):
-            database._execute(
-                """
-                INSERT INTO game DEFAULT VALUES
-                """
+
+    database._execute(
+        """
+        CREATE INDEX IF NOT EXISTS move_post
+        ON move(post, id)
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox(
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            channel TEXT DEFAULT '' NOT NULL,
+            uci TEXT,
+            draw_offer INTEGER NOT NULL,
+            outcome INTEGER CHECK(outcome >= 1 AND outcome <= 7) NOT NULL,
+            attempts INTEGER DEFAULT 0 NOT NULL,
+            next_attempt REAL DEFAULT 0 NOT NULL
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox_post(
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            entry INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            png BLOB NOT NULL,
+            reply TEXT NOT NULL,
+            reddit_id TEXT,
+            replied INTEGER DEFAULT 0 NOT NULL,
+            FOREIGN KEY(entry) REFERENCES outbox(id)
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS comment_checkpoint(
+            channel TEXT PRIMARY KEY NOT NULL,
+            fullname TEXT NOT NULL,
+            created REAL NOT NULL
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS answered_comment(
+            reddit_id TEXT PRIMARY KEY NOT NULL,
+            created REAL NOT NULL
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS packed_move(
+            game INTEGER PRIMARY KEY NOT NULL,
+            codes BLOB NOT NULL,
+            draw_offers BLOB NOT NULL,
+            FOREIGN KEY(game) REFERENCES game(id)
+        )
+        """
+    )
+
+    # Positions reached by each move. The starting position is shared by every
+    # game and is not indexed.
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS position(
+            hash INTEGER NOT NULL,
+            game INTEGER NOT NULL,
+            ply INTEGER NOT NULL,
+            post INTEGER,
+            PRIMARY KEY(game, ply),
+            FOREIGN KEY(game) REFERENCES game(id),
+            FOREIGN KEY(post) REFERENCES post(id)
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE INDEX IF NOT EXISTS position_hash
+        ON position(hash)
+        """
+    )
+
+    # Parse results for recently used positions, see Database.spellings
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS spelling_position(
+            hash INTEGER PRIMARY KEY NOT NULL,
+            used INTEGER NOT NULL
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE INDEX IF NOT EXISTS spelling_position_used
+        ON spelling_position(used)
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS spelling(
+            hash INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY(hash, text),
+            FOREIGN KEY(hash) REFERENCES spelling_position(hash)
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS vote(
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            post TEXT NOT NULL,
+            comment TEXT NOT NULL,
+            author TEXT,
+            move TEXT,
+            draw_offer INTEGER NOT NULL,
+            error TEXT,
+            score INTEGER NOT NULL
+        )
+        """
+    )
+
+    database._execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS vote_post
+        ON vote(post, comment)
+        """
+    )
+
+    # Running totals kept up to date by play_move and new_game, see Database.stats
+    for table, key in [
+        ("stat_total", "TEXT"),
+        ("stat_outcome", "INTEGER"),
+        ("stat_length", "INTEGER"),
+    ]:
+        database._execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table}(
+                key {key} PRIMARY KEY NOT NULL,
+                value INTEGER NOT NULL
             )
-        case _:
-            raise ResponseFormatException()
+            """
+        )
 
-    database._commit()
+    # Number of posts by how many votes were counted on them, kept by record_votes
+    database._execute(
+        """
+        CREATE TABLE IF NOT EXISTS stat_votes(
+            votes INTEGER PRIMARY KEY NOT NULL,
+            posts INTEGER NOT NULL
+        )
+        """
+    )
 
-    res = database._execute(
+    database._execute(
         """
-        SELECT MAX(id)
-        FROM post
+        CREATE TABLE IF NOT EXISTS setting(
+            name TEXT PRIMARY KEY NOT NULL,
+            value TEXT NOT NULL
+        )
         """
     )
+
+    database._packed = database._setting("packed_moves") == "1"
+    if packed_moves:
+        database.migrate_to_packed()
+
+    # Tables from before channels existed were limited to a single game
+    if not _has_column(database, "outbox", "channel"):
+        database._execute(
+            """
+            ALTER TABLE outbox
+            ADD COLUMN channel TEXT DEFAULT '' NOT NULL
+            """
+        )
+
+    if not _has_column(database, "comment_checkpoint", "channel"):
+        database._execute(
+            """
+            ALTER TABLE comment_checkpoint
+            RENAME TO comment_checkpoint_old
+            """
+        )
+        database._execute(
+            """
+            CREATE TABLE comment_checkpoint(
+                channel TEXT PRIMARY KEY NOT NULL,
+                fullname TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        database._execute(
+            """
+            INSERT INTO comment_checkpoint(channel, fullname, created)
+            SELECT '', fullname, created
+            FROM comment_checkpoint_old
+            """
+        )
+        database._execute(
+            """
+            DROP TABLE comment_checkpoint_old
+            """
+        )
+
+    # Answers from before they were pruned are dropped with the next checkpoint
+    if not _has_column(database, "answered_comment", "created"):
+        database._execute(
+            """
+            ALTER TABLE answered_comment
+            ADD COLUMN created REAL DEFAULT 0 NOT NULL
+            """
+        )
+
+    database._execute(
+        """
+        CREATE INDEX IF NOT EXISTS answered_comment_created
+        ON answered_comment(created)
+        """
+    )
+
+    database._commit()
+
+    # Databases from before the current summary tables start from a full count
+    if database._setting("stats") != STATS_VERSION:
+        database.rebuild_stats()
+
+    return database
+
+
+# Each post shows the position after one more move, so the first post comments
+# the starting position and the rest follow the moves. The final post of a game
+# that ended on the board shows a move the game table does not keep.
+def _game_pgn(
+    game: GameRecord, posts: Iterable[str], moves: Iterable[MoveNormal]
+) -> str:
+    import chess.pgn
+
+    pgn = chess.pgn.Game()
+    pgn.headers["Event"] = "Community Chess"
+    pgn.headers["Site"] = (
+        f"https://www.reddit.com/r/{game.channel}" if game.channel else "?"
+    )
+    pgn.headers["Round"] = str(game.id)
+    pgn.headers["Result"] = result(game.outcome)
+    pgn.headers["Termination"] = game.outcome.name.lower().replace("_", " ")
+
+    node: chess.pgn.GameNode = pgn
+    nodes = [node]
+    for move in moves:
+        node = node.add_main_variation(move.move)
+        node.comment = "draw offered" if move.offer_draw else ""
+        nodes.append(node)
+    for ply, post in enumerate(posts):
+        node = nodes[min(ply, len(nodes) - 1)]
+        node.comment = ", ".join(filter(None, [node.comment, f"post {post}"]))
+    return str(pgn)
+
+
+def _board(moves: Iterable[MoveNormal]) -> chess.Board:
+    board = chess.Board()
+    for move in moves:
+        board.push(move.move)
+    return board
+
+
+def _has_column(database: Database, table: str, column: str) -> bool:
+    res = database._execute(
+        f"""
+        SELECT COUNT(*)
+        FROM pragma_table_info('{table}')
+        WHERE name = ?
+        """,
+        column,
+    )
     match res.fetchone():
-        case (int(),):
-            return database
-        case (None,):
-            return NeedsInitialPost(database)
+        case (int() as count,):
+            return count > 0
         case _:
             raise ResponseFormatException()
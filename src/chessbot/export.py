@@ -0,0 +1,26 @@
+import logging
+import sys
+from typing import TextIO
+from chessbot import database
+from chessbot.arguments import ExportArguments
+from chessbot.database import Database
+
+
+def export(args: ExportArguments) -> None:
+    logging.basicConfig(level=logging.INFO)
+    db = database.open_readonly(args.database)
+    match args.output:
+        case None:
+            count = write_pgn(db, sys.stdout, args.page_size)
+        case str() as path:
+            with open(path, "w", encoding="utf-8") as file:
+                count = write_pgn(db, file, args.page_size)
+    logging.info("Exported %d games", count)
+
+
+def write_pgn(db: Database, file: TextIO, page_size: int) -> int:
+    count = 0
+    for pgn in db.export_pgn(page_size):
+        file.write(f"{pgn}\n\n")
+        count += 1
+    return count
@@ -0,0 +1,90 @@
+from __future__ import annotations
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+import sys
+from typing import Any, overload
+from chessbot.moves import MoveNormal
+from chessbot.packed import decode_move, encode_move
+
+
+# The moves of one game stored as 16-bit codes with a parallel draw-offer
+# bitset. MoveNormal values are only created when an item is read.
+class History(Sequence[MoveNormal]):
+    __slots__ = ("_codes", "_draw_offers")
+
+    _codes: array[int]
+    _draw_offers: bytearray
+
+    def __init__(self, moves: Iterable[MoveNormal] = ()) -> None:
+        self._codes = array("H")
+        self._draw_offers = bytearray()
+        for move in moves:
+            self.append(move)
+
+    @staticmethod
+    def from_packed(codes: bytes, draw_offers: bytes) -> History:
+        history = History()
+        history._codes.frombytes(codes)
+        if sys.byteorder == "big":
+            history._codes.byteswap()
+        history._draw_offers.extend(draw_offers)
+        return history
+
+    def packed(self) -> tuple[bytes, bytes]:
+        codes = array("H", self._codes)
+        if sys.byteorder == "big":
+            codes.byteswap()
+        return codes.tobytes(), bytes(self._draw_offers)
+
+    def append(self, move: MoveNormal) -> None:
+        ply = len(self._codes)
+        self._codes.append(encode_move(move.move))
+        if ply & 7 == 0:
+            self._draw_offers.append(0)
+        if move.offer_draw:
+            self._draw_offers[ply >> 3] |= 1 << (ply & 7)
+
+    def clear(self) -> None:
+        self._codes = array("H")
+        self._draw_offers = bytearray()
+
+    def offered_draw(self) -> bool:
+        return len(self._codes) > 0 and self._offered_draw(len(self._codes) - 1)
+
+    def _offered_draw(self, ply: int) -> bool:
+        return self._draw_offers[ply >> 3] >> (ply & 7) & 1 == 1
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @overload
+    def __getitem__(self, index: int) -> MoveNormal: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[MoveNormal]: ...
+
+    def __getitem__(self, index: int | slice) -> MoveNormal | list[MoveNormal]:
+        match index:
+            case int():
+                ply = range(len(self._codes))[index]
+                return MoveNormal(
+                    decode_move(self._codes[ply]), self._offered_draw(ply)
+                )
+            case slice():
+                return [self[ply] for ply in range(len(self._codes))[index]]
+
+    def __iter__(self) -> Iterator[MoveNormal]:
+        for ply in range(len(self._codes)):
+            yield self[ply]
+
+    def __eq__(self, other: Any) -> bool:
+        match other:
+            case Sequence():
+                return len(self) == len(other) and all(
+                    a == b for a, b in zip(self, other)
+                )
+            case _:
+                return False
+
+    def __repr__(self) -> str:
+        return f"History({list(self)!r})"
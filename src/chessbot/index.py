@@ -0,0 +1,13 @@
+import logging
+from chessbot import database
+from chessbot.arguments import IndexArguments
+
+
+def index(args: IndexArguments) -> None:
+    logging.basicConfig(level=logging.INFO)
+    db = database.connect(args.database)
+    total = 0
+    while (count := db.backfill_positions(args.games)) > 0:
+        total += count
+        logging.info("Indexed positions for %d games", total)
+    logging.info("Position index is up to date")
@@ -0,0 +1,52 @@
+import logging
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Final, TextIO
+from chessbot.arguments import LogLevel
+
+# Fields that log calls attach with `extra`, appended to the message when present
+FIELDS: Final = ("channel", "comment", "post", "stage", "duration_ms")
+
+_FORMAT: Final = "%(levelname)s:%(name)s:%(message)s"
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = " ".join(
+            f"{name}={getattr(record, name)}"
+            for name in FIELDS
+            if hasattr(record, name)
+        )
+        return f"{message} [{fields}]" if fields else message
+
+
+# The stock handler formats records before queueing them, which would leave that
+# work on the event loop
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# Records are only queued by the calling thread. Formatting and writing happen on
+# the listener thread, which is drained before returning.
+@contextmanager
+def configured(level: LogLevel, stream: TextIO = sys.stderr) -> Iterator[None]:
+    records: SimpleQueue[logging.LogRecord] = SimpleQueue()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(StructuredFormatter(_FORMAT))
+    listener = QueueListener(records, output)
+    handler = _DeferredQueueHandler(records)
+
+    root = logging.getLogger()
+    root.setLevel(str(level).upper())
+    root.addHandler(handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+        root.removeHandler(handler)
@@ -0,0 +1,43 @@
+from asyncio import Future, Queue
+from typing import NamedTuple
+from chessbot.moves import Move, MoveError
+
+
+# Sent a lead time ahead of the post deadline, or as an early close check that
+# only plays a move if the leader is `early_margin` votes ahead. `played` is
+# resolved with whether a move was made.
+class NotifyPlayMove(NamedTuple):
+    deadline: float | None = None
+    early_margin: int | None = None
+    played: Future[bool] | None = None
+
+
+class NotifyFlushOutbox:
+    pass
+
+
+# A top-level comment reduced to plain data so that it can cross process
+# boundaries
+class IncomingComment(NamedTuple):
+    id: str
+    subreddit: str
+    author: str | None
+    body: str
+    created_utc: float
+
+    @property
+    def fullname(self) -> str:
+        return f"t1_{self.id}"
+
+
+# Stamped with the FEN it was parsed against, so a result that raced with a move
+# being played can be recognized as stale
+class ParsedComment(NamedTuple):
+    comment: IncomingComment
+    fen: str
+    move: Move | MoveError | None
+
+
+Message = IncomingComment | ParsedComment | NotifyPlayMove | NotifyFlushOutbox
+
+MsgQueue = Queue[Message]
@@ -12,11 +12,15 @@ class MoveNormal(NamedTuple):
 
 
 class MoveResign:
+    __slots__ = ()
+
     def __eq__(self, other: Any) -> bool:
         return isinstance(other, MoveResign)
 
 
 class MoveDraw:
+    __slots__ = ()
+
     def __eq__(self, other: Any) -> bool:
         return isinstance(other, MoveDraw)
 
@@ -34,6 +38,8 @@ class MoveError(Exception):
     kind: MoveErrorKind
 
     def __init__(self, move_text: str, kind: MoveErrorKind) -> None:
+        # Passing the fields on lets results be pickled back from parse workers
+        super().__init__(move_text, kind)
         self.move_text = move_text
         self.kind = kind
 
@@ -45,6 +51,12 @@ class MoveError(Exception):
                 return False
 
 
+# Parse results for one position keyed by normalized move text: the UCI of a
+# legal move, the MoveErrorKind of a rejected one, or empty for text that is not a
+# move at all
+Spellings = dict[str, str]
+
+
 _MOVE_PATTERN: Final = re.compile(
     r"^ *(?:([Dd][Rr][Aa][Ww])|([Rr][Ee][Ss][Ii][Gg][Nn])|(?:([Oo0](?:-[Oo0]){1,2}|[KQRBNkqrbn]?[a-h]?[1-8]?x?[a-h][1-8](?:\=[QRBNqrbn])?[+#]?)|([a-h][1-8][a-h][1-8][KQRBNkqrbn]?))( +[Dd][Rr][Aa][Ww])?)"
 )
@@ -53,6 +65,7 @@ _MOVE_PATTERN: Final = re.compile(
 def move_for_comment(
     comment: str,
     board: Board,
+    spellings: Spellings | None = None,
 ) -> Move | MoveError | None:
     first_line = comment.partition("\n")[0]
     m = _MOVE_PATTERN.search(first_line)
@@ -66,23 +79,50 @@ def move_for_comment(
                 case (None, str(), None, None, None):
                     return MoveResign()
                 case (None, None, str() as san, None, None):
-                    return _san_move(board, san, False)
+                    return _san_move(board, san, False, spellings)
                 case (None, None, str() as san, None, str()):
-                    return _san_move(board, san, True)
+                    return _san_move(board, san, True, spellings)
                 case (None, None, None, str() as uci, None):
-                    return _uci_move(board, uci, False)
+                    return _uci_move(board, uci, False, spellings)
                 case (None, None, None, str() as uci, str()):
-                    return _uci_move(board, uci, True)
+                    return _uci_move(board, uci, True, spellings)
                 case _:
                     raise Exception("Unexpected regex match groups")
         case _:
             assert_never(m)
 
 
+def legal_spellings(board: Board) -> Spellings:
+    # The usual ways of writing each legal move, including the piece and
+    # destination alone so that ambiguous spellings are classified up front
+    texts: set[str] = set()
+    for move in board.legal_moves:
+        san = board.san(move)
+        texts |= {san, san.rstrip("+#"), move.uci()}
+        piece = board.piece_type_at(move.from_square)
+        if piece is not None and piece != chess.PAWN and not board.is_castling(move):
+            capture = "x" if board.is_capture(move) else ""
+            destination = chess.square_name(move.to_square)
+            symbol = chess.piece_symbol(piece).upper()
+            texts |= {f"{symbol}{destination}", f"{symbol}{capture}{destination}"}
+
+    spellings: Spellings = {}
+    for text in texts:
+        match _try_parse_move(Board.parse_san, board, text, False, None):
+            case MoveNormal() as parsed:
+                spellings[text] = parsed.move.uci()
+            case MoveError() as error:
+                spellings[text] = str(error.kind)
+            case None:
+                spellings[text] = ""
+    return spellings
+
+
 def _san_move(
     board: Board,
     san: str,
     offer_draw: bool,
+    spellings: Spellings | None,
 ) -> MoveNormal | MoveError | None:
     san = (
         san.replace("k", "K")
@@ -92,15 +132,16 @@ def _san_move(
         .replace("n", "N")
         .replace("o", "O")
     )
-    return _try_parse_move(Board.parse_san, board, san, offer_draw)
+    return _try_parse_move(Board.parse_san, board, san, offer_draw, spellings)
 
 
 def _uci_move(
     board: Board,
     uci: str,
     offer_draw: bool,
+    spellings: Spellings | None,
 ) -> MoveNormal | MoveError | None:
-    return _try_parse_move(Board.parse_uci, board, uci, offer_draw)
+    return _try_parse_move(Board.parse_uci, board, uci, offer_draw, spellings)
 
 
 def _try_parse_move(
@@ -108,7 +149,18 @@ def _try_parse_move(
     board: Board,
     move_text: str,
     offer_draw: bool,
+    spellings: Spellings | None,
 ) -> MoveNormal | MoveError | None:
+    match None if spellings is None else spellings.get(move_text):
+        case None:
+            pass
+        case "":
+            return None
+        case MoveErrorKind.AMBIGUOUS | MoveErrorKind.ILLEGAL as kind:
+            return MoveError(move_text, MoveErrorKind(kind))
+        case str() as uci:
+            return MoveNormal(chess.Move.from_uci(uci), offer_draw)
+
     try:
         return MoveNormal(f(board, move_text), offer_draw)
     except chess.InvalidMoveError:
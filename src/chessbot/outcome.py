@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from enum import IntEnum, auto
 import chess
 from chess import Board, Termination
@@ -14,7 +15,7 @@ class Outcome(IntEnum):
     RESIGNATION_BLACK = auto()
 
 
-def for_move(move: MoveNormal, board: Board, moves: list[MoveNormal]) -> Outcome:
+def for_move(move: MoveNormal, board: Board, moves: Sequence[MoveNormal]) -> Outcome:
     return (
         Outcome.DRAW
         if len(moves) > 0 and moves[-1].offer_draw and move.offer_draw
@@ -53,3 +54,15 @@ def _for_board(board: Board) -> Outcome:
                     | Termination.VARIANT_DRAW
                 ):
                     raise Exception("Unexpected variant termination")
+
+
+def result(outcome: Outcome) -> str:
+    match outcome:
+        case Outcome.ONGOING:
+            return "*"
+        case Outcome.DRAW | Outcome.STALEMATE:
+            return "1/2-1/2"
+        case Outcome.VICTORY_WHITE | Outcome.RESIGNATION_BLACK:
+            return "1-0"
+        case Outcome.VICTORY_BLACK | Outcome.RESIGNATION_WHITE:
+            return "0-1"
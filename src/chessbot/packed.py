@@ -0,0 +1,20 @@
+import chess
+import chess.polyglot
+
+# Each move is 16 bits: from square in bits 0-5, to square in bits 6-11, and the
+# promotion piece type (or zero) in bits 12-14. Draw offers are kept in a
+# separate bitset with one bit per ply.
+
+
+def encode_move(move: chess.Move) -> int:
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code: int) -> chess.Move:
+    promotion = code >> 12 & 0b111
+    return chess.Move(code & 0b111111, code >> 6 & 0b111111, promotion or None)
+
+
+# Zobrist hash of the position, shifted into the signed range of an SQLite integer
+def position_hash(board: chess.Board) -> int:
+    return chess.polyglot.zobrist_hash(board) - (1 << 63)
@@ -0,0 +1,329 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from asyncio import Future, Task
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable
+from enum import IntEnum, auto
+from typing import Any, Final, NamedTuple, TypeVar
+
+from asyncprawcore.exceptions import RequestException, ServerError, TooManyRequests
+
+T = TypeVar("T")
+
+# Reddit allows 1000 requests per 600 second window for OAuth clients
+_DEFAULT_RATE: Final = 1000 / 600
+_DEFAULT_BURST: Final = 10
+_MIN_RATE: Final = 0.01
+_MAX_RETRIES: Final = 4
+_BACKOFF_BASE: Final = 1.0
+_BACKOFF_CAP: Final = 60.0
+_RETRY_BUDGET: Final = 10.0
+_RETRY_BUDGET_EARN: Final = 0.1
+_MAX_AUTHORS: Final = 10000
+
+# With --workers, the ingestion process lists comments through its own client on
+# the same account, so it is given this fraction of the rate limit and the main
+# process keeps the rest
+INGESTION_SHARE: Final = 0.25
+
+_RETRYABLE: Final = (RequestException, ServerError, TooManyRequests)
+
+
+class Priority(IntEnum):
+    POST = auto()
+    REPLY = auto()
+    READ = auto()
+
+
+class RateLimit(NamedTuple):
+    remaining: float
+    reset_seconds: float
+
+
+class WaitStats:
+    calls: int
+    retries: int
+    total_wait: float
+    max_wait: float
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.calls += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def mean_wait(self) -> float:
+        return self.total_wait / self.calls if self.calls > 0 else 0.0
+
+
+# Caps retries at a fraction of successful calls so that an outage does not
+# multiply the request volume
+class RetryBudget:
+    _tokens: float
+    _capacity: float
+    _earn: float
+
+    def __init__(
+        self, capacity: float = _RETRY_BUDGET, earn: float = _RETRY_BUDGET_EARN
+    ) -> None:
+        self._tokens = capacity
+        self._capacity = capacity
+        self._earn = earn
+
+    def spend(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def earn(self) -> None:
+        self._tokens = min(self._capacity, self._tokens + self._earn)
+
+
+class AuthorBucket(NamedTuple):
+    tokens: float
+    refilled: float
+
+
+# Drops move comments from authors who post faster than `rate` per second after a
+# burst, before they are parsed or answered. Buckets for the least recently seen
+# authors are evicted past `capacity`, which at worst hands them a fresh burst.
+class AuthorLimiter:
+    _rate: float
+    _burst: float
+    _capacity: int
+    _clock: Callable[[], float]
+    _buckets: OrderedDict[str, AuthorBucket]
+    allowed: int
+    suppressed: int
+    evicted: int
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        capacity: int = _MAX_AUTHORS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._capacity = capacity
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.suppressed = 0
+        self.evicted = 0
+
+    def allow(self, author: str) -> bool:
+        now = self._clock()
+        bucket = self._buckets.pop(author, None)
+        tokens = (
+            self._burst
+            if bucket is None
+            else min(self._burst, bucket.tokens + (now - bucket.refilled) * self._rate)
+        )
+        allowed = tokens >= 1
+        self._buckets[author] = AuthorBucket(tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > self._capacity:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.suppressed += 1
+        return allowed
+
+    def summary(self) -> str:
+        return (
+            f"{self.allowed} allowed, {self.suppressed} suppressed, "
+            f"{len(self._buckets)} authors tracked, {self.evicted} evicted"
+        )
+
+
+class RequestScheduler:
+    _share: float
+    _full_rate: float
+    _rate: float
+    _burst: float
+    _tokens: float
+    _refilled: float
+    # When the exhausted rate limit window resets, on the scheduler's clock
+    _reset: float | None
+    _waiters: list[tuple[Priority, int, Future[None]]]
+    _sequence: itertools.count[int]
+    _dispatcher: Task[None] | None
+    _feed: Callable[[], RateLimit | None]
+    _max_retries: int
+    _budget: RetryBudget
+    _clock: Callable[[], float]
+    metrics: dict[Priority, WaitStats]
+
+    def __init__(
+        self,
+        feed: Callable[[], RateLimit | None] = lambda: None,
+        rate: float = _DEFAULT_RATE,
+        burst: float = _DEFAULT_BURST,
+        max_retries: int = _MAX_RETRIES,
+        share: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._share = share
+        self._full_rate = rate * share
+        self._rate = self._full_rate
+        self._burst = burst * share
+        self._tokens = self._burst
+        self._clock = clock
+        self._refilled = clock()
+        self._reset = None
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self._feed = feed
+        self._max_retries = max_retries
+        self._budget = RetryBudget()
+        self.metrics = {priority: WaitStats() for priority in Priority}
+
+    # Timeouts and server errors can arrive after Reddit has acted on a request,
+    # so requests that create something are only retried when rate limited
+    async def call(
+        self,
+        priority: Priority,
+        request: Callable[[], Awaitable[T]],
+        idempotent: bool = True,
+    ) -> T:
+        attempt = 0
+        while True:
+            await self.acquire(priority)
+            try:
+                result = await request()
+            except _RETRYABLE as e:
+                self._update()
+                if isinstance(e, TooManyRequests):
+                    self._tokens = 0
+                elif not idempotent:
+                    raise
+                if attempt >= self._max_retries or not self._budget.spend():
+                    raise
+                delay = jittered_backoff(attempt, _BACKOFF_BASE, _BACKOFF_CAP)
+                attempt += 1
+                self.metrics[priority].retries += 1
+                logging.warning(
+                    "Retrying %s request in %.2f seconds after %r",
+                    priority.name,
+                    delay,
+                    e,
+                )
+                await asyncio.sleep(delay)
+                continue
+            self._update()
+            self._budget.earn()
+            return result
+
+    def listing(
+        self, priority: Priority, function: Callable[..., AsyncIterator[Any]]
+    ) -> Callable[..., AsyncIterator[Any]]:
+        # Each listing call is a single request for up to one page of items
+        def scheduled(**kwargs: Any) -> AsyncIterator[Any]:
+            async def generator() -> AsyncIterator[Any]:
+                await self.acquire(priority)
+                async for item in function(**kwargs):
+                    yield item
+                self._update()
+
+            return generator()
+
+        return scheduled
+
+    async def acquire(self, priority: Priority) -> None:
+        start = time.monotonic()
+        future: Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        self.metrics[priority].record(time.monotonic() - start)
+
+    def update(self, limit: RateLimit) -> None:
+        self._refill()
+        remaining = limit.remaining * self._share
+        self._rate = max(_MIN_RATE, remaining / max(limit.reset_seconds, 1))
+        self._tokens = min(self._tokens, remaining)
+        # Nothing is left until the window resets, whatever the rate says
+        self._reset = None
+        if remaining < 1:
+            self._reset = self._refilled + max(limit.reset_seconds, 0)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{priority.name}: {stats.calls} calls, {stats.retries} retries, "
+            f"{stats.mean_wait():.3f}s mean wait, {stats.max_wait:.3f}s max wait"
+            for priority, stats in self.metrics.items()
+        )
+
+    def _update(self) -> None:
+        limit = self._feed()
+        if limit is not None:
+            self.update(limit)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if self._reset is not None and now >= self._reset:
+            # A new window starts with the full allowance
+            self._reset = None
+            self._rate = self._full_rate
+            self._tokens = self._burst
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._refilled) * self._rate
+        )
+        self._refilled = now
+
+    async def _dispatch(self) -> None:
+        try:
+            while len(self._waiters) > 0:
+                self._refill()
+                if self._reset is not None:
+                    await asyncio.sleep(self._reset - self._refilled)
+                    continue
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self._rate)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue
+                self._tokens -= 1
+                future.set_result(None)
+        finally:
+            self._dispatcher = None
+
+
+def reddit_rate_limit(reddit: Any) -> Callable[[], RateLimit | None]:
+    # asyncprawcore tracks the x-ratelimit-* response headers on the session
+    def feed() -> RateLimit | None:
+        limiter = getattr(getattr(reddit, "_core", None), "_rate_limiter", None)
+        remaining = getattr(limiter, "remaining", None)
+        if remaining is None:
+            return None
+        reset_timestamp = getattr(limiter, "reset_timestamp", None)
+        reset_seconds = (
+            reset_timestamp - time.time()
+            if isinstance(reset_timestamp, float)
+            else getattr(limiter, "window_size", 600)
+        )
+        return RateLimit(float(remaining), float(reset_seconds))
+
+    return feed
+
+
+def jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict, deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Final, NamedTuple, cast
+
+import chess
+from asyncpraw.models.comment_forest import CommentForest
+from asyncpraw.models.reddit.submission import Submission
+from asyncpraw.models.reddit.subreddit import Subreddit
+from asyncpraw.reddit import Reddit
+
+from chessbot import database, logs
+from chessbot.arguments import ReplayArguments
+from chessbot.bot import handle_messages
+from chessbot.database import Database, NeedsInitialPost
+from chessbot.messages import IncomingComment, Message, MsgQueue, NotifyPlayMove
+from chessbot.moves import MoveNormal
+from chessbot.ratelimit import RequestScheduler
+
+# Feeds a file written with `chessbot --capture` through handle_messages as fast
+# as possible, against a stand-in for Reddit that serves the captured responses,
+# then compares what the bot sent with what it sent when the capture was made.
+
+_UNLIMITED: Final = 1e9
+
+
+class Author(NamedTuple):
+    name: str
+
+
+class CapturedComment(NamedTuple):
+    id: str
+    author: Author | None
+    body: str
+    score: int
+    is_submitter: bool
+
+
+class ChannelCapture(NamedTuple):
+    moves: list[MoveNormal]
+    post: str
+    # Handler inputs in the order they were handled, labelled with their stage
+    inputs: list[tuple[str, Message]]
+    posts: list[str]
+    titles: list[str]
+    replies: dict[str, str]
+
+
+class StageTimes(NamedTuple):
+    calls: int
+    total_ms: float
+    median_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+class ChannelReport(NamedTuple):
+    channel: str
+    stages: dict[str, StageTimes]
+    replies: int
+    mismatched_replies: list[str]
+    mismatched_titles: bool
+
+
+class _Comments:
+    _comments: list[CapturedComment]
+
+    def __init__(self, comments: list[CapturedComment]) -> None:
+        self._comments = comments
+
+    async def __aiter__(self) -> AsyncIterator[CapturedComment]:
+        for comment in self._comments:
+            yield comment
+
+
+class ReplaySubmission(Submission):
+    def __init__(self, id: str, comments: list[CapturedComment]) -> None:
+        super().__init__(cast(Reddit, None), id=id)
+        self.comments = cast(CommentForest, _Comments(comments))
+
+    async def reply(self, body: str) -> None:
+        return None
+
+
+class _ReplyTarget:
+    _id: str
+    _replies: dict[str, str]
+
+    def __init__(self, id: str, replies: dict[str, str]) -> None:
+        self._id = id
+        self._replies = replies
+
+    async def reply(self, body: str) -> None:
+        self._replies[self._id] = body
+
+
+# Stands in for both the Reddit client and the subreddit. Posts get the ids they
+# were given in the capture so that the comments later read from them line up.
+class ReplayReddit:
+    display_name: str
+    _posts: deque[str]
+    _comments: dict[str, deque[list[CapturedComment]]]
+    _extra: int
+    titles: list[str]
+    replies: dict[str, str]
+
+    def __init__(
+        self,
+        channel: str,
+        posts: list[str],
+        comments: dict[str, deque[list[CapturedComment]]],
+    ) -> None:
+        self.display_name = channel
+        self._posts = deque(posts)
+        self._comments = comments
+        self._extra = 0
+        self.titles = []
+        self.replies = {}
+
+    async def submission(self, id: str, fetch: bool = True) -> Submission:
+        captured = self._comments.get(id)
+        comments = captured.popleft() if fetch and captured else []
+        return ReplaySubmission(id, comments)
+
+    async def comment(self, id: str, fetch: bool = True) -> _ReplyTarget:
+        return _ReplyTarget(id, self.replies)
+
+    async def submit_image(self, title: str, image_path: str) -> Submission:
+        self.titles.append(title)
+        if self._posts:
+            return ReplaySubmission(self._posts.popleft(), [])
+        self._extra += 1
+        return ReplaySubmission(f"replay{self._extra}", [])
+
+
+def replay(args: ReplayArguments) -> None:
+    with logs.configured(args.log):
+        captures, comments = load(args.capture)
+        for channel, captured in captures.items():
+            report = asyncio.run(replay_channel(channel, captured, comments))
+            print(format_report(report))
+
+
+def load(
+    path: str,
+) -> tuple[dict[str, ChannelCapture], dict[str, deque[list[CapturedComment]]]]:
+    captures: dict[str, ChannelCapture] = {}
+    comments: dict[str, deque[list[CapturedComment]]] = defaultdict(deque)
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            event: dict[str, Any] = json.loads(line)
+            match event:
+                case {"event": "start", "channel": channel, "moves": moves}:
+                    # A restart continues the same channel from where it was
+                    if channel not in captures:
+                        captures[channel] = ChannelCapture(
+                            [
+                                MoveNormal(chess.Move.from_uci(uci), draw_offer)
+                                for uci, draw_offer in moves
+                            ],
+                            event["post"],
+                            [],
+                            [],
+                            [],
+                            {},
+                        )
+                case {"event": "comment", "comment": fields}:
+                    comment = IncomingComment(**fields)
+                    captures[comment.subreddit].inputs.append(("comment", comment))
+                case {"event": "tick", "channel": channel}:
+                    tick = NotifyPlayMove(None, event.get("early_margin"))
+                    captures[channel].inputs.append(("tick", tick))
+                case {"event": "votes", "post": post, "comments": seen}:
+                    comments[post].append(
+                        [
+                            CapturedComment(
+                                c["id"],
+                                None if c["author"] is None else Author(c["author"]),
+                                c["body"],
+                                c["score"],
+                                c["is_submitter"],
+                            )
+                            for c in seen
+                        ]
+                    )
+                case {"event": "post", "channel": channel, "id": id, "title": title}:
+                    captures[channel].posts.append(id)
+                    captures[channel].titles.append(title)
+                case {"event": "reply", "channel": channel, "comment": id}:
+                    captures[channel].replies[id] = event["text"]
+                case _:
+                    logging.warning("Skipping unknown capture event %s", line.strip())
+    return captures, comments
+
+
+async def replay_channel(
+    channel: str,
+    captured: ChannelCapture,
+    comments: dict[str, deque[list[CapturedComment]]],
+) -> ChannelReport:
+    reddit = ReplayReddit(channel, captured.posts, comments)
+    durations: dict[str, list[float]] = defaultdict(list)
+    with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(1) as renderer:
+        shared_database = database.connect(os.path.join(directory, "replay.db"))
+        prepare(shared_database, channel, captured)
+        queue: MsgQueue = asyncio.Queue()
+        handler = asyncio.create_task(
+            handle_messages(
+                cast(Reddit, reddit),
+                cast(Subreddit, reddit),
+                queue,
+                shared_database,
+                channel,
+                RequestScheduler(rate=_UNLIMITED, burst=_UNLIMITED),
+                renderer,
+            )
+        )
+        for stage, message in captured.inputs:
+            start = time.perf_counter()
+            await queue.put(message)
+            await queue.join()
+            durations[stage].append((time.perf_counter() - start) * 1000)
+        handler.cancel()
+        await asyncio.gather(handler, return_exceptions=True)
+
+    mismatched = [
+        id for id, text in captured.replies.items() if reddit.replies.get(id) != text
+    ]
+    return ChannelReport(
+        channel,
+        {stage: stage_times(times) for stage, times in durations.items()},
+        len(reddit.replies),
+        mismatched,
+        reddit.titles != captured.titles,
+    )
+
+
+# Recreates the game as it stood when the capture started, ending on the post
+# that was current then
+def prepare(shared_database: Database, channel: str, captured: ChannelCapture) -> None:
+    match shared_database.for_channel(channel):
+        case NeedsInitialPost(db):
+            posts = [f"replay-start{ply}" for ply in range(len(captured.moves))]
+            posts.append(captured.post)
+            db.insert_post(posts[0])
+            for move, post in zip(captured.moves, posts[1:]):
+                db.play_move(move, post)
+        case Database():
+            raise Exception("Replay database should start empty")
+
+
+def stage_times(times: list[float]) -> StageTimes:
+    ordered = sorted(times)
+    return StageTimes(
+        len(ordered),
+        sum(ordered),
+        statistics.median(ordered),
+        ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        ordered[-1],
+    )
+
+
+def format_report(report: ChannelReport) -> str:
+    lines = [f"Channel {report.channel or '(default)'}:"]
+    for stage, times in report.stages.items():
+        lines.append(
+            f"  {stage:>8}: {times.calls} in {times.total_ms:.1f} ms, median "
+            f"{times.median_ms:.2f} ms, p95 {times.p95_ms:.2f} ms, max "
+            f"{times.max_ms:.2f} ms"
+        )
+    lines.append(f"  replies: {report.replies}")
+    for id in report.mismatched_replies:
+        lines.append(f"  reply to {id} differs from the capture")
+    if report.mismatched_titles:
+        lines.append("  posts differ from the capture")
+    return "\n".join(lines)
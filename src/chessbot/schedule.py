@@ -1,26 +1,37 @@
 from typing import NamedTuple
 from datetime import timedelta, datetime, UTC
 
+# Deadlines are on the monotonic clock, with `utc` giving the wall time at `now`.
+# Each one follows from the previous deadline rather than from when the last move
+# finished, so time spent playing a move does not push later posts back.
+
 
 class ScheduleTimeout(NamedTuple):
     seconds: int
 
-    def next_post_seconds(self) -> float:
-        return self.seconds
+    def next_deadline(self, previous: float | None, now: float, utc: datetime) -> float:
+        if previous is None:
+            return now + self.seconds
+        return previous + self.seconds
 
 
 class ScheduleUtc(NamedTuple):
     posts_per_day: int
 
-    def next_post_seconds(self) -> float:
-        utc = datetime.now(UTC)
-        today = datetime.combine(utc.date(), datetime.min.time(), UTC)
+    def next_deadline(self, previous: float | None, now: float, utc: datetime) -> float:
         seconds_per_post = 24 * 60 * 60 / self.posts_per_day
-        seconds_today = (utc - today).total_seconds()
-        elapsed_posts = seconds_today / seconds_per_post
-        next_post = elapsed_posts.__ceil__() * seconds_per_post
-        next_post_time = today + timedelta(seconds=next_post)
-        return (next_post_time - utc).total_seconds()
+        after = utc
+        if previous is not None:
+            # The previous deadline was on a slot boundary, but skew between the
+            # two clocks can place it just before one. Half a slot of tolerance
+            # keeps that from choosing the same slot again.
+            after += timedelta(seconds=previous - now + seconds_per_post / 2)
+        today = datetime.combine(after.date(), datetime.min.time(), UTC)
+        elapsed_posts = (after - today).total_seconds() // seconds_per_post
+        next_post_time = today + timedelta(
+            seconds=(elapsed_posts + 1) * seconds_per_post
+        )
+        return now + (next_post_time - utc).total_seconds()
 
 
 Schedule = ScheduleTimeout | ScheduleUtc
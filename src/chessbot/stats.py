@@ -0,0 +1,57 @@
+from chessbot import database
+from chessbot.arguments import StatsArguments
+from chessbot.database import Stats
+from chessbot.outcome import Outcome, result
+
+# Game lengths are reported in buckets of this many full moves
+_LENGTH_BUCKET = 10
+
+
+def stats(args: StatsArguments) -> None:
+    if args.rebuild:
+        database.connect(args.database).rebuild_stats()
+    print(summary(database.open_readonly(args.database).stats()))
+
+
+def summary(stats: Stats) -> str:
+    games = sum(stats.outcomes.values())
+    draw_rate = stats.draw_offers / stats.moves if stats.moves > 0 else 0
+    posts = sum(stats.votes.values())
+    votes = sum(count * posts for count, posts in stats.votes.items())
+    lines = [
+        f"Finished games: {games}",
+        f"Moves played: {stats.moves}",
+        f"Moves offering a draw: {stats.draw_offers} ({draw_rate:.1%})",
+        f"Votes counted: {votes} on {posts} posts "
+        f"({votes / posts if posts > 0 else 0:.1f} per post, "
+        f"most {max(stats.votes, default=0)})",
+        "",
+        "Results:",
+    ]
+
+    by_result: dict[str, int] = {}
+    for outcome, count in stats.outcomes.items():
+        by_result[result(outcome)] = by_result.get(result(outcome), 0) + count
+    for label, key in [
+        ("White wins", "1-0"),
+        ("Black wins", "0-1"),
+        ("Draws", "1/2-1/2"),
+    ]:
+        lines.append(f"  {label}: {by_result.get(key, 0)}")
+
+    lines += ["", "Outcomes:"]
+    for outcome in Outcome:
+        if outcome != Outcome.ONGOING:
+            name = outcome.name.lower().replace("_", " ")
+            lines.append(f"  {name}: {stats.outcomes.get(outcome, 0)}")
+
+    buckets: dict[int, int] = {}
+    for plies, count in stats.lengths.items():
+        bucket = (plies + 1) // 2 // _LENGTH_BUCKET
+        buckets[bucket] = buckets.get(bucket, 0) + count
+    lines += ["", "Game lengths in moves:"]
+    for bucket, count in sorted(buckets.items()):
+        start = bucket * _LENGTH_BUCKET
+        lines.append(f"  {start}-{start + _LENGTH_BUCKET - 1}: {count}")
+
+    return "\n".join(lines)
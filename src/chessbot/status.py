@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from asyncio import CancelledError, StreamReader, StreamWriter
+from typing import Any, Final, NamedTuple
+from chessbot.database import Vote
+
+# A read-only HTTP server for dashboards that would otherwise poll Reddit. The
+# message handlers publish the current game here as it changes, already encoded,
+# so requests are answered from memory without touching the database or Reddit.
+# Publishing does nothing unless the server was started.
+
+_HOST: Final = "127.0.0.1"
+_REQUEST_TIMEOUT: Final = 5.0
+_MAX_HEADERS: Final = 100
+
+_REASONS: Final = {
+    200: "OK",
+    304: "Not Modified",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+}
+
+
+class Resource(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: str
+
+
+class Standing(NamedTuple):
+    move: str
+    score: int
+    comments: int
+
+
+_resources: dict[str, Resource] | None = None
+_health: dict[str, dict[str, Any]] = {}
+_started = 0.0
+
+
+def start() -> None:
+    global _resources, _started
+    _resources = {}
+    _started = time.time()
+    _health.clear()
+    _publish_health()
+
+
+def stop() -> None:
+    global _resources
+    _resources = None
+
+
+def enabled() -> bool:
+    return _resources is not None
+
+
+async def serve(port: int, host: str = _HOST) -> None:
+    server = await asyncio.start_server(_handle, host, port)
+    logging.info("Serving status on http://%s:%d/health", host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    except CancelledError:
+        pass
+
+
+def publish_board(channel: str, fen: str, pgn: str, ply: int, post: str) -> None:
+    if _resources is None:
+        return
+    _put(f"/{channel}/fen", fen.encode(), "text/plain; charset=utf-8")
+    _put(f"/{channel}/pgn", pgn.encode(), "application/x-chess-pgn")
+    _health[channel] = {"ply": ply, "post": post, "updated": round(time.time())}
+    _publish_health()
+
+
+def publish_png(channel: str, png: bytes) -> None:
+    if _resources is None:
+        return
+    _put(f"/{channel}/board.png", png, "image/png")
+
+
+def publish_votes(channel: str, post: str, votes: list[Vote]) -> None:
+    if _resources is None:
+        return
+    body = {
+        "post": post,
+        "standings": [standing._asdict() for standing in standings(votes)],
+    }
+    _put(f"/{channel}/votes", json.dumps(body).encode(), "application/json")
+
+
+def standings(votes: list[Vote]) -> list[Standing]:
+    moves: dict[str, Standing] = {}
+    for vote in votes:
+        if vote.move is None or vote.error is not None:
+            continue
+        standing = moves.get(vote.move, Standing(vote.move, vote.score, 0))
+        moves[vote.move] = Standing(
+            vote.move, max(standing.score, vote.score), standing.comments + 1
+        )
+    return sorted(moves.values(), key=lambda standing: -standing.score)
+
+
+def _publish_health() -> None:
+    body = {"status": "ok", "started": round(_started), "channels": _health}
+    _put("/health", json.dumps(body).encode(), "application/json")
+
+
+def _put(path: str, body: bytes, content_type: str) -> None:
+    assert _resources is not None
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    _resources[path] = Resource(body, content_type, etag)
+
+
+async def _handle(reader: StreamReader, writer: StreamWriter) -> None:
+    try:
+        async with asyncio.timeout(_REQUEST_TIMEOUT):
+            request = await reader.readline()
+            headers: dict[str, str] = {}
+            for _ in range(_MAX_HEADERS):
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        _respond(writer, request.decode("latin-1").split(), headers)
+        await writer.drain()
+    except TimeoutError:
+        _write(writer, 408)
+    except (ConnectionError, UnicodeError):
+        pass
+    finally:
+        writer.close()
+
+
+def _respond(writer: StreamWriter, request: list[str], headers: dict[str, str]) -> None:
+    match request:
+        case ["GET" | "HEAD" as method, target, _]:
+            path = target.split("?", 1)[0].rstrip("/").lower()
+            resource = None if _resources is None else _resources.get(path)
+            if resource is None:
+                _write(writer, 404)
+            elif resource.etag in [
+                tag.strip() for tag in headers.get("if-none-match", "").split(",")
+            ]:
+                _write(writer, 304, resource)
+            else:
+                _write(writer, 200, resource, method == "GET")
+        case _:
+            _write(writer, 405)
+
+
+def _write(
+    writer: StreamWriter,
+    status: int,
+    resource: Resource | None = None,
+    include_body: bool = False,
+) -> None:
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", "Connection: close"]
+    if resource is not None:
+        lines += [f"ETag: {resource.etag}", "Cache-Control: no-cache"]
+    if status == 200 and resource is not None:
+        lines += [
+            f"Content-Type: {resource.content_type}",
+            f"Content-Length: {len(resource.body)}",
+        ]
+    elif status != 304:
+        lines.append("Content-Length: 0")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    if include_body and resource is not None:
+        writer.write(resource.body)
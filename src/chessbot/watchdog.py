@@ -0,0 +1,125 @@
+import asyncio
+import gc
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from asyncio import CancelledError
+from collections import Counter
+from collections.abc import Callable
+from typing import Final, NamedTuple
+
+# Samples memory use on an interval. When resident memory crosses the limit, the
+# largest allocation sites are written to a file and optional caches are dropped,
+# so that an out-of-memory kill leaves evidence of what grew behind.
+
+_SAMPLE_INTERVAL: Final = 10.0
+_TOP_SITES: Final = 25
+# Another dump is only written once memory falls back below this fraction
+_REARM: Final = 0.9
+_MB: Final = 1024 * 1024
+
+
+class MemorySample(NamedTuple):
+    rss: int
+    traced: int
+    traced_peak: int
+
+    def describe(self) -> str:
+        text = f"resident {self.rss / _MB:.1f} MB"
+        if tracemalloc.is_tracing():
+            text += (
+                f", traced {self.traced / _MB:.1f} MB, "
+                f"traced peak {self.traced_peak / _MB:.1f} MB"
+            )
+        return text
+
+
+class Watchdog:
+    _limit: int
+    _directory: str
+    _shed: list[Callable[[], None]]
+    _tripped: bool
+    dumps: int
+
+    def __init__(
+        self, limit: int, directory: str, shed: list[Callable[[], None]]
+    ) -> None:
+        self._limit = limit
+        self._directory = directory
+        self._shed = shed
+        self._tripped = False
+        self.dumps = 0
+
+    async def run(self, interval: float = _SAMPLE_INTERVAL) -> None:
+        logging.info("Entered memory watchdog")
+        while True:
+            try:
+                await asyncio.sleep(interval)
+            except CancelledError:
+                break
+            await self.check(sample())
+
+    async def check(self, current: MemorySample) -> str | None:
+        logging.debug("Memory use: %s", current.describe())
+        if current.rss < self._limit * _REARM:
+            self._tripped = False
+        if self._tripped or current.rss < self._limit:
+            return None
+        self._tripped = True
+
+        # Collecting the statistics is slow, so keep it off the event loop
+        path = await asyncio.to_thread(dump, self._directory, current)
+        self.dumps += 1
+        for shed in self._shed:
+            shed()
+        gc.collect()
+        logging.warning(
+            "Memory use crossed %.1f MB with %s, wrote %s and shed caches, now %s",
+            self._limit / _MB,
+            current.describe(),
+            path,
+            sample().describe(),
+        )
+        return path
+
+
+def sample() -> MemorySample:
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    return MemorySample(rss_bytes(), traced, traced_peak)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current use, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def dump(directory: str, current: MemorySample) -> str:
+    path = os.path.join(directory, f"memory-{time.time_ns()}.txt")
+    lines = [current.describe()]
+    if tracemalloc.is_tracing():
+        lines.append(f"Top {_TOP_SITES} allocation sites:")
+        statistics = tracemalloc.take_snapshot().statistics("traceback")
+        for statistic in statistics[:_TOP_SITES]:
+            lines.append(f"{statistic.size / 1024:.1f} KiB in {statistic.count} blocks")
+            lines += [f"  {line}" for line in statistic.traceback.format()]
+    else:
+        # Without tracing, object counts by type still show what is accumulating
+        lines.append(
+            f"Top {_TOP_SITES} object types, run with --memory-trace for sites:"
+        )
+        counts = Counter(type(o).__qualname__ for o in gc.get_objects())
+        lines += [
+            f"{count:10} {name}" for name, count in counts.most_common(_TOP_SITES)
+        ]
+
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    return path
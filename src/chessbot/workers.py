@@ -0,0 +1,95 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing
+import queue
+from asyncio import CancelledError
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue as ProcessQueue
+from typing import Final
+
+from chessbot import logs
+from chessbot.arguments import Arguments
+from chessbot.bot import connect, forward_comments
+from chessbot.messages import IncomingComment
+from chessbot.ratelimit import INGESTION_SHARE, RequestScheduler, reddit_rate_limit
+
+# Multi-process runtime: one process streams comments for every channel, a pool
+# parses them against the current position and the main process owns the
+# database and posting.
+
+_RECEIVE_TIMEOUT: Final = 1.0
+
+
+class IngestionExitedException(Exception):
+    def __init__(self) -> None:
+        super().__init__("Comment ingestion process exited")
+
+
+class Workers:
+    _comments: ProcessQueue[IncomingComment]
+    _ingestion: BaseProcess
+    parser: ProcessPoolExecutor
+
+    def __init__(self, args: Arguments) -> None:
+        # Forking would copy the running event loop, so children start fresh
+        context = multiprocessing.get_context("spawn")
+        self._comments = context.Queue()
+        self._ingestion = context.Process(
+            target=ingest_comments, args=(args, self._comments), daemon=True
+        )
+        self._ingestion.start()
+        self.parser = ProcessPoolExecutor(args.workers, mp_context=context)
+
+    async def receive(self, send: Callable[[IncomingComment], Awaitable[None]]) -> None:
+        logging.info("Entered receive_comments")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                comment = await loop.run_in_executor(None, _receive, self._comments)
+            except CancelledError:
+                break
+
+            match comment:
+                case IncomingComment():
+                    await send(comment)
+                case None:
+                    if not self._ingestion.is_alive():
+                        raise IngestionExitedException()
+
+    def close(self) -> None:
+        self._ingestion.terminate()
+        self.parser.shutdown(cancel_futures=True)
+
+
+def ingest_comments(args: Arguments, comments: ProcessQueue[IncomingComment]) -> None:
+    with logs.configured(args.log):
+        asyncio.run(_ingest_comments(args, comments))
+
+
+async def _ingest_comments(
+    args: Arguments, comments: ProcessQueue[IncomingComment]
+) -> None:
+    logging.info("Entered ingest_comments")
+    reddit = connect(args)
+    try:
+        subreddit = await reddit.subreddit(
+            "+".join(channel.subreddit for channel in args.channels)
+        )
+        scheduler = RequestScheduler(reddit_rate_limit(reddit), share=INGESTION_SHARE)
+
+        async def send(comment: IncomingComment) -> None:
+            comments.put(comment)
+
+        await forward_comments(subreddit, send, scheduler)
+    finally:
+        await reddit.close()
+
+
+def _receive(comments: ProcessQueue[IncomingComment]) -> IncomingComment | None:
+    try:
+        return comments.get(timeout=_RECEIVE_TIMEOUT)
+    except queue.Empty:
+        return None
@@ -1,5 +1,14 @@
+from typing import overload
+
+@overload
 def svg2png(
     bytestring: str,
     *,
-    write_to: None | str = None,
+    write_to: None = None,
+) -> bytes: ...
+@overload
+def svg2png(
+    bytestring: str,
+    *,
+    write_to: str,
 ) -> None: ...
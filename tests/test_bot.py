@@ -0,0 +1,183 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import cast
+from unittest.mock import MagicMock, patch
+from asyncpraw.exceptions import RedditAPIException
+from asyncpraw.models.reddit.submission import Submission
+from asyncpraw.models.reddit.subreddit import Subreddit
+from asyncpraw.reddit import Reddit
+from asyncprawcore.exceptions import ServerError
+from chess import Board
+from chessbot import database
+from chessbot.bot import (
+    close_early,
+    flush_outbox,
+    play_move,
+    reply_for_comment,
+    vote_margin,
+)
+from chessbot.database import Database, NeedsInitialPost, RenderedPost, Vote
+from chessbot.messages import MsgQueue, NotifyPlayMove
+from chessbot.moves import MoveErrorKind
+from chessbot.ratelimit import RequestScheduler
+from chessbot.replay import Author, CapturedComment, ReplayReddit
+
+
+def rendered(board: Board, *_: object) -> RenderedPost:
+    return RenderedPost(f"ply {board.ply()}", b"png", board.fen())
+
+
+class FailingReddit(ReplayReddit):
+    failures: list[Exception]
+
+    async def submit_image(self, title: str, image_path: str) -> Submission:
+        if self.failures:
+            raise self.failures.pop()
+        return await super().submit_image(title, image_path)
+
+
+# Runs play_move against the replay stand-in for Reddit, with rendering replaced
+# since it needs native libraries
+@patch("chessbot.bot.render_post", rendered)
+class TestPlayMove(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.renderer = ThreadPoolExecutor(1)
+        shared = database.connect(os.path.join(self.directory.name, "bot.db"))
+        match shared.for_channel("chess"):
+            case NeedsInitialPost(db):
+                db.insert_post("a")
+            case Database():
+                raise Exception("Database should start empty")
+        opened = shared.for_channel("chess")
+        assert isinstance(opened, Database)
+        self.database = opened
+        self.board = Board()
+        self.queue: MsgQueue = asyncio.Queue()
+        self.scheduler = RequestScheduler(rate=1e9, burst=1e9)
+        votes = [CapturedComment("b", Author("alice"), "e4", 5, False)]
+        self.reddit = FailingReddit("chess", ["c"], {"a": deque([votes])})
+        self.reddit.failures = []
+
+    async def asyncTearDown(self) -> None:
+        self.renderer.shutdown()
+        self.directory.cleanup()
+
+    async def play(self, deadline: float | None = None) -> bool:
+        return await play_move(
+            cast(Reddit, self.reddit),
+            cast(Subreddit, self.reddit),
+            self.board,
+            self.database,
+            self.scheduler,
+            self.renderer,
+            self.queue,
+            deadline,
+        )
+
+    async def flush(self) -> None:
+        await flush_outbox(
+            cast(Reddit, self.reddit),
+            cast(Subreddit, self.reddit),
+            self.board,
+            self.database,
+            self.scheduler,
+            self.queue,
+        )
+
+    async def test_pending_post_keeps_board(self) -> None:
+        self.reddit.failures = [ServerError(MagicMock())]
+        self.assertTrue(await self.play())
+        self.assertIsNotNone(self.database.outbox())
+        self.assertEqual(0, self.board.ply())
+        self.assertEqual(
+            "I found the move e2e4 in your comment.",
+            reply_for_comment("e4", self.board, False),
+        )
+
+        entry = self.database.outbox()
+        assert entry is not None
+        self.database.outbox_failed(entry.id, 0)
+        await self.flush()
+        self.assertIsNone(self.database.outbox())
+        self.assertEqual(["e2e4"], [move.uci() for move in self.board.move_stack])
+        self.assertEqual(["ply 1"], self.reddit.titles)
+
+    async def test_api_error_is_retried(self) -> None:
+        self.reddit.failures = [
+            RedditAPIException(
+                [["RATELIMIT", "you are doing that too much", "ratelimit"]]
+            )
+        ]
+        self.assertTrue(await self.play())
+        entry = self.database.outbox()
+        assert entry is not None
+        self.assertEqual(1, entry.attempts)
+        self.assertEqual(0, self.board.ply())
+
+    async def test_deferred_until_deadline(self) -> None:
+        self.assertTrue(await self.play(time.monotonic() + 60))
+        entry = self.database.outbox()
+        assert entry is not None
+        self.assertAlmostEqual(time.time() + 60, entry.next_attempt, delta=1)
+
+        await self.flush()
+        self.assertIsNotNone(self.database.outbox())
+        self.assertEqual([], self.reddit.titles)
+        self.assertEqual(0, self.board.ply())
+
+
+def vote(move: str | None, score: int, error: MoveErrorKind | None = None) -> Vote:
+    return Vote("a", f"{move}{score}", None, move, False, error, score)
+
+
+class TestEarlyClose(unittest.IsolatedAsyncioTestCase):
+    def test_vote_margin(self) -> None:
+        self.assertEqual(0, vote_margin([]))
+        self.assertEqual(3, vote_margin([vote("e2e4", 3)]))
+        self.assertEqual(0, vote_margin([vote("e2e4", 3), vote("d2d4", 3)]))
+        # Comments for the same move do not compete with each other
+        self.assertEqual(3, vote_margin([vote("e2e4", 3), vote("e2e4", 2)]))
+        self.assertEqual(1, vote_margin([vote("draw", 4), vote("e2e4", 3)]))
+        self.assertEqual(2, vote_margin([vote("e2e4", 5), vote("resign", 3)]))
+        # Invalid and downvoted comments are never selected
+        self.assertEqual(
+            2,
+            vote_margin(
+                [vote("e2e4", 2), vote("Ke2", 9, MoveErrorKind.ILLEGAL), vote(None, 7)]
+            ),
+        )
+        self.assertEqual(0, vote_margin([vote("e2e4", -2)]))
+
+    async def test_close_early(self) -> None:
+        queue: MsgQueue = asyncio.Queue()
+        self.assertFalse(await close_early(queue, time.monotonic() + 60, None))
+
+        async def answer(results: list[bool]) -> list[NotifyPlayMove]:
+            ticks = []
+            for result in results:
+                tick = await queue.get()
+                assert isinstance(tick, NotifyPlayMove) and tick.played is not None
+                tick.played.set_result(result)
+                ticks.append(tick)
+            return ticks
+
+        with patch("chessbot.bot._EARLY_CLOSE_INTERVAL", 0.01):
+            answering = asyncio.create_task(answer([False, True]))
+            self.assertTrue(await close_early(queue, time.monotonic() + 60, 3))
+            ticks = await answering
+            self.assertEqual([(None, 3), (None, 3)], [t[:2] for t in ticks])
+
+            # Gives up in time for the regular notification
+            answering = asyncio.create_task(answer([False] * 100))
+            self.assertFalse(await close_early(queue, time.monotonic() + 0.05, 3))
+            answering.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
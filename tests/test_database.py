@@ -1,12 +1,22 @@
+import sqlite3
 import unittest
 import chess
 from chessbot.database import (
+    CommentCheckpoint,
+    GameRecord,
+    PositionMatch,
+    Stats,
+    Vote,
     open as open_database,
     Database,
     NeedsInitialPost,
+    connect,
+    open_readonly,
     Outcome,
+    RenderedPost,
 )
-from chessbot.moves import MoveNormal
+from chessbot.moves import MoveErrorKind, MoveNormal
+from chessbot.packed import position_hash
 
 
 def cleared() -> Database:
@@ -49,6 +59,253 @@ class TestDatabase(unittest.TestCase):
         database.insert_post("arst")
         self.assertEqual("arst", database.previous_post())
 
+    def test_outbox(self) -> None:
+        database = cleared()
+        self.assertIsNone(database.outbox())
+
+        board = chess.Board()
+        e4 = MoveNormal(board.push_san("e4"), True)
+        database.enqueue_outbox(
+            e4, Outcome.ONGOING, [RenderedPost("title", b"png", "reply")]
+        )
+        entry = database.outbox()
+        assert entry is not None
+        self.assertEqual(e4, entry.move)
+        self.assertEqual(b"png", entry.posts[0].post.png)
+
+        database.outbox_failed(entry.id, 10.0)
+        database.outbox_submitted(entry.posts[0].id, "a")
+        entry = database.outbox()
+        assert entry is not None
+        self.assertEqual(1, entry.attempts)
+        self.assertEqual("a", entry.posts[0].reddit_id)
+
+        database.complete_outbox(entry)
+        self.assertIsNone(database.outbox())
+        self.assertEqual([e4], database.moves())
+        self.assertEqual("a", database.previous_post())
+
+    def test_comment_checkpoint(self) -> None:
+        database = cleared()
+        self.assertIsNone(database.comment_checkpoint())
+
+        database.answer_comments(
+            [CommentCheckpoint("t1_b", 2.0), CommentCheckpoint("t1_a", 1.0)]
+        )
+        self.assertEqual(CommentCheckpoint("t1_b", 2.0), database.comment_checkpoint())
+        # Answers older than the checkpoint are forgotten, since catching up
+        # never lists them again
+        self.assertEqual({"t1_b"}, database.answered_comments(["t1_a", "t1_b", "t1_c"]))
+        database.answer_comments([CommentCheckpoint("t1_c", 2.0)])
+        self.assertEqual(
+            {"t1_b", "t1_c"}, database.answered_comments(["t1_a", "t1_b", "t1_c"])
+        )
+        database.answer_comments([CommentCheckpoint("t1_d", 3.0)])
+        self.assertEqual(set(), database.answered_comments(["t1_a", "t1_b", "t1_c"]))
+
+        # Another channel's older checkpoint holds back pruning
+        first = cleared().for_channel("first")
+        second = connect("test.db").for_channel("second")
+        assert isinstance(first, Database)
+        assert isinstance(second, NeedsInitialPost)
+        first.answer_comments([CommentCheckpoint("t1_a", 1.0)])
+        second.database.answer_comments([CommentCheckpoint("t1_b", 3.0)])
+        self.assertEqual({"t1_a", "t1_b"}, first.answered_comments(["t1_a", "t1_b"]))
+
+    def test_packed_moves(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        e4 = MoveNormal(board.push_san("e4"), False)
+        database.play_move(e4, "a")
+        database.new_game("b", Outcome.DRAW, "c")
+
+        board = chess.Board()
+        d4 = MoveNormal(board.push_san("d4"), True)
+        d5 = MoveNormal(board.push_san("d5"), False)
+        database.play_move(d4, "d")
+
+        database.migrate_to_packed()
+        self.assertEqual([e4], database.moves(1))
+        self.assertEqual([d4], database.moves())
+
+        database.play_move(d5, "e")
+        self.assertEqual([d4, d5], database.moves())
+
+    def test_channels(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        e4 = MoveNormal(board.push_san("e4"), False)
+        database.play_move(e4, "a")
+        database.answer_comments([CommentCheckpoint("t1_a", 1.0)])
+
+        # The first named channel adopts rows written before channels existed
+        first = connect("test.db").for_channel("first")
+        assert isinstance(first, Database)
+        self.assertEqual([e4], first.moves())
+        self.assertEqual("a", first.previous_post())
+        self.assertEqual(CommentCheckpoint("t1_a", 1.0), first.comment_checkpoint())
+
+        match connect("test.db").for_channel("second"):
+            case NeedsInitialPost(second):
+                second.insert_post("b")
+            case Database():
+                self.fail("New channel should need an initial post")
+        self.assertEqual([], second.moves())
+        self.assertIsNone(second.comment_checkpoint())
+
+        board = chess.Board()
+        d4 = MoveNormal(board.push_san("d4"), False)
+        second.play_move(d4, "c")
+        second.new_game("d", Outcome.DRAW, "e")
+        self.assertEqual([e4], first.moves())
+        self.assertEqual("a", first.previous_post())
+        self.assertEqual([d4], second.moves(2))
+        self.assertEqual("e", second.previous_post())
+
+    def test_export_pgn(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        database.play_move(MoveNormal(board.push_san("e4"), True), "a")
+        database.play_move(MoveNormal(board.push_san("e5"), False), "b")
+        database.new_game("c", Outcome.RESIGNATION_WHITE, "d")
+        database.new_game("e", Outcome.DRAW, "f")
+
+        games = list(database.export_pgn(page_size=1))
+        self.assertEqual(2, len(games))
+        self.assertIn('[Result "0-1"]', games[0])
+        self.assertIn(
+            "{ post init } 1. e4 { draw offered, post a } 1... e5 { post b, post c } 0-1",
+            games[0],
+        )
+        self.assertIn('[Result "1/2-1/2"]', games[1])
+        self.assertIn("{ post d, post e } 1/2-1/2", games[1])
+
+    def test_iterators(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        e4 = MoveNormal(board.push_san("e4"), False)
+        e5 = MoveNormal(board.push_san("e5"), True)
+        database.play_move(e4, "a")
+        database.play_move(e5, "b")
+        database.new_game("c", Outcome.STALEMATE, "d")
+
+        for packed in [False, True]:
+            if packed:
+                database.migrate_to_packed()
+            reader = open_readonly("test.db")
+            self.assertEqual(
+                [
+                    GameRecord(1, "", Outcome.STALEMATE),
+                    GameRecord(2, "", Outcome.ONGOING),
+                ],
+                list(reader.iter_games(page_size=1)),
+            )
+            self.assertEqual(
+                ["init", "a", "b", "c"], list(reader.iter_posts(1, page_size=3))
+            )
+            self.assertEqual([e4, e5], list(reader.iter_moves(1, page_size=1)))
+            self.assertEqual([], list(reader.iter_moves(2, page_size=1)))
+
+        with self.assertRaises(sqlite3.OperationalError):
+            reader.insert_post("e")
+
+    def test_release_memory(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        e4 = MoveNormal(board.push_san("e4"), False)
+        database.play_move(e4, "a")
+        database.release_memory()
+
+        e5 = MoveNormal(board.push_san("e5"), False)
+        database.play_move(e5, "b")
+        self.assertEqual([e4, e5], database.moves())
+
+    def test_positions(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        database.play_move(MoveNormal(board.push_san("e4"), False), "a")
+        after_e4 = board.fen()
+        database.new_game("b", Outcome.DRAW, "c")
+        board = chess.Board()
+        database.play_move(MoveNormal(board.push_san("e4"), False), "d", board=board)
+
+        expected = [PositionMatch(1, 1, "a"), PositionMatch(2, 1, "d")]
+        self.assertEqual(expected, database.find_position(after_e4))
+        self.assertEqual([], database.find_position(chess.Board().fen()))
+
+        database._execute("DELETE FROM position")
+        self.assertEqual(1, database.backfill_positions(games=1))
+        self.assertEqual(expected[:1], database.find_position(after_e4))
+        self.assertEqual(1, database.backfill_positions(games=1))
+        self.assertEqual(0, database.backfill_positions(games=1))
+        self.assertEqual(expected, database.find_position(after_e4))
+
+    def test_spellings(self) -> None:
+        database = cleared()
+        start = chess.Board()
+        after_e4 = chess.Board()
+        after_e4.push_san("e4")
+
+        spellings = database.spellings(start, limit=2)
+        self.assertEqual("e2e4", spellings["e4"])
+        self.assertEqual(spellings, database.spellings(start, limit=2))
+        database.spellings(after_e4, limit=2)
+
+        # Touching the start position leaves the position after e4 to be evicted
+        database.spellings(start, limit=2)
+        database.spellings(chess.Board("8/8/8/8/8/8/8/K6k w - - 0 1"), limit=2)
+        cached = database._execute("SELECT COUNT(*) FROM spelling_position")
+        self.assertEqual((2,), cached.fetchone())
+        self.assertEqual({}, database._cached_spellings(position_hash(after_e4)))
+        self.assertEqual(spellings, database._cached_spellings(position_hash(start)))
+
+    def test_stats(self) -> None:
+        database = cleared()
+        board = chess.Board()
+        database.play_move(MoveNormal(board.push_san("e4"), True), "a")
+        database.play_move(MoveNormal(board.push_san("e5"), False), "b")
+        database.new_game("c", Outcome.RESIGNATION_WHITE, "d")
+        database.new_game("e", Outcome.DRAW, "f")
+        board = chess.Board()
+        database.play_move(MoveNormal(board.push_san("d4"), True), "g")
+        database.record_votes(
+            [
+                Vote("a", "h", "alice", "e7e5", False, None, 2),
+                Vote("a", "i", "bob", None, False, None, 1),
+                Vote("b", "j", "alice", "g1f3", False, None, 1),
+            ]
+        )
+
+        expected = Stats(
+            3,
+            2,
+            {Outcome.RESIGNATION_WHITE: 1, Outcome.DRAW: 1},
+            {2: 1, 0: 1},
+            {2: 1, 1: 1},
+        )
+        self.assertEqual(expected, database.stats())
+        database.rebuild_stats()
+        self.assertEqual(expected, database.stats())
+        database.migrate_to_packed()
+        database.rebuild_stats()
+        self.assertEqual(expected, database.stats())
+
+    def test_votes(self) -> None:
+        database = cleared()
+        e4 = Vote("a", "b", "alice", "e2e4", True, None, 3)
+        ke2 = Vote("a", "c", None, "Ke2", False, MoveErrorKind.ILLEGAL, 1)
+        other = Vote("d", "e", "bob", "resign", False, None, 2)
+        database.record_votes([ke2, other])
+        self.assertEqual({1: 2}, database.stats().votes)
+        database.record_votes([e4, ke2._replace(score=5)])
+        self.assertEqual([ke2._replace(score=5), e4], database.votes("a"))
+        self.assertEqual([other], database.votes("d"))
+
+        # Rescoring a vote leaves its post in the same bucket
+        self.assertEqual({1: 1, 2: 1}, database.stats().votes)
+        database.record_votes([e4._replace(score=4)])
+        self.assertEqual({1: 1, 2: 1}, database.stats().votes)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import itertools
+import tracemalloc
+import unittest
+import chess
+from chessbot.history import History
+from chessbot.moves import MoveNormal
+
+
+def knight_shuffle(plies: int) -> list[MoveNormal]:
+    board = chess.Board()
+    sans = itertools.cycle(["Nf3", "Nf6", "Ng1", "Ng8"])
+    return [
+        MoveNormal(board.push_san(next(sans)), ply % 7 == 0) for ply in range(plies)
+    ]
+
+
+class TestHistory(unittest.TestCase):
+    def test_sequence(self) -> None:
+        moves = knight_shuffle(8)
+        history = History(moves)
+        self.assertEqual(moves, history)
+        self.assertEqual(moves[-1], history[-1])
+        self.assertEqual(moves[2:5], history[2:5])
+        self.assertTrue(history.offered_draw())
+        with self.assertRaises(IndexError):
+            history[8]
+
+    def test_packed(self) -> None:
+        history = History(knight_shuffle(9))
+        codes, draw_offers = history.packed()
+        self.assertEqual(18, len(codes))
+        self.assertEqual(2, len(draw_offers))
+        self.assertEqual(history, History.from_packed(codes, draw_offers))
+
+    def test_footprint(self) -> None:
+        moves = knight_shuffle(500)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            history = History(moves)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(500, len(history))
+        self.assertLess(after - before, 2048)
+
+
+if __name__ == "__main__":
+    unittest.main()
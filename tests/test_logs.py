@@ -0,0 +1,32 @@
+import io
+import logging
+import logging.handlers
+import unittest
+from chessbot import logs
+from chessbot.arguments import LogLevel
+
+
+class TestLogs(unittest.TestCase):
+    def test_configured(self) -> None:
+        stream = io.StringIO()
+        with logs.configured(LogLevel.INFO, stream):
+            logging.info("Playing move %s", "e2e4", extra={"post": "abc"})
+            logging.info("Entered handle_messages")
+            logging.debug("Handled message", extra={"stage": "NotifyPlayMove"})
+        self.assertEqual(
+            stream.getvalue().splitlines(),
+            [
+                "INFO:root:Playing move e2e4 [post=abc]",
+                "INFO:root:Entered handle_messages",
+            ],
+        )
+        self.assertFalse(
+            any(
+                isinstance(handler, logging.handlers.QueueHandler)
+                for handler in logging.getLogger().handlers
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
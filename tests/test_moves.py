@@ -4,10 +4,12 @@ from chessbot.moves import (
     MoveError,
     MoveErrorKind,
     MoveResign,
+    legal_spellings,
     move_for_comment,
     MoveNormal,
 )
 import chess
+import pickle
 from chess import Board
 
 
@@ -67,6 +69,25 @@ class TestMoves(unittest.TestCase):
     def test_bare_draw(self):
         self.assertEqual(move_for_comment("draw", Board()), MoveDraw())
 
+    def test_pickle(self):
+        error = MoveError("Ke2", MoveErrorKind.ILLEGAL)
+        self.assertEqual(error, pickle.loads(pickle.dumps(error)))
+
+    def test_spellings(self):
+        board = Board()
+        board.push_san("e3")
+        board.push_san("e6")
+        board.push_san("Nc3")
+        board.push_san("e5")
+        spellings = legal_spellings(board)
+        self.assertEqual("ambiguous", spellings["Ne2"])
+        self.assertEqual("g1f3", spellings["Nf3"])
+        for comment in [*spellings, "Ke2 draw", "ne2", "Nf3 draw", "Qh5 nice"]:
+            self.assertEqual(
+                move_for_comment(comment, board),
+                move_for_comment(comment, board, spellings),
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+import chess
+from chessbot.packed import decode_move, encode_move
+
+
+class TestPacked(unittest.TestCase):
+    def test_round_trip_move(self) -> None:
+        for move in [
+            chess.Move(chess.E2, chess.E4),
+            chess.Move(chess.A7, chess.A8, chess.QUEEN),
+            chess.Move(chess.H2, chess.G1, chess.KNIGHT),
+            chess.Move(chess.A1, chess.H8),
+        ]:
+            self.assertEqual(move, decode_move(encode_move(move)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+from asyncprawcore.exceptions import ServerError
+from chessbot.ratelimit import AuthorLimiter, Priority, RateLimit, RequestScheduler
+
+
+class TestRequestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_priority_order(self) -> None:
+        scheduler = RequestScheduler(rate=100, burst=1)
+        order: list[Priority] = []
+
+        async def request(priority: Priority) -> None:
+            order.append(priority)
+
+        await scheduler.acquire(Priority.READ)
+        async with asyncio.TaskGroup() as group:
+            for priority in [Priority.READ, Priority.REPLY, Priority.POST]:
+                group.create_task(
+                    scheduler.call(priority, lambda p=priority: request(p))
+                )
+        self.assertEqual([Priority.POST, Priority.REPLY, Priority.READ], order)
+
+    async def test_retry(self) -> None:
+        scheduler = RequestScheduler(rate=100, burst=10)
+        attempts = 0
+
+        async def flaky() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts < 2:
+                raise ServerError(MagicMock())
+            return "ok"
+
+        self.assertEqual("ok", await scheduler.call(Priority.POST, flaky))
+        self.assertEqual(1, scheduler.metrics[Priority.POST].retries)
+
+    async def test_no_retry_unless_idempotent(self) -> None:
+        scheduler = RequestScheduler(rate=100, burst=10)
+        attempts = 0
+
+        async def submit() -> str:
+            nonlocal attempts
+            attempts += 1
+            raise ServerError(MagicMock())
+
+        with self.assertRaises(ServerError):
+            await scheduler.call(Priority.POST, submit, idempotent=False)
+        self.assertEqual(1, attempts)
+
+    async def test_feed(self) -> None:
+        scheduler = RequestScheduler(lambda: RateLimit(0, 600), rate=100, burst=10)
+
+        async def request() -> None:
+            pass
+
+        await scheduler.call(Priority.READ, request)
+        self.assertEqual(0, scheduler._tokens)
+
+    async def test_share(self) -> None:
+        scheduler = RequestScheduler(rate=100, burst=10, share=0.25)
+        self.assertEqual(2.5, scheduler._tokens)
+        scheduler.update(RateLimit(600, 600))
+        self.assertEqual(0.25, scheduler._rate)
+
+    async def test_window_reset(self) -> None:
+        # An exhausted window resumes when it resets rather than at the rate floor
+        self.assertEqual([30.0], await window_reset_sleeps(30.0))
+        self.assertEqual([600.0], await window_reset_sleeps(600.0))
+
+
+async def window_reset_sleeps(reset: float) -> list[float]:
+    now = 0.0
+    slept: list[float] = []
+
+    async def sleep(delay: float) -> None:
+        nonlocal now
+        slept.append(delay)
+        now += delay
+
+    scheduler = RequestScheduler(rate=100, burst=10, clock=lambda: now)
+    scheduler.update(RateLimit(0, reset))
+    with patch("asyncio.sleep", sleep):
+        await scheduler.acquire(Priority.READ)
+    # The new window starts full, less the request that waited for it
+    assert scheduler._tokens == 9
+    return slept
+
+
+class TestAuthorLimiter(unittest.TestCase):
+    def test_burst_and_refill(self) -> None:
+        now = 0.0
+        limiter = AuthorLimiter(rate=0.5, burst=2, clock=lambda: now)
+        self.assertEqual([True, True, False], [limiter.allow("a") for _ in range(3)])
+        self.assertTrue(limiter.allow("b"))
+        now = 2.0
+        self.assertEqual([True, False], [limiter.allow("a") for _ in range(2)])
+        self.assertEqual((4, 2), (limiter.allowed, limiter.suppressed))
+
+    def test_eviction(self) -> None:
+        limiter = AuthorLimiter(rate=0, burst=1, capacity=2, clock=lambda: 0.0)
+        for author in ["a", "b", "a", "c"]:
+            limiter.allow(author)
+        self.assertEqual(1, limiter.evicted)
+        self.assertFalse(limiter.allow("a"))
+        self.assertTrue(limiter.allow("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
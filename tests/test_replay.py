@@ -0,0 +1,148 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from collections import deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, cast
+import chess
+from asyncpraw.models.reddit.subreddit import Subreddit
+from asyncpraw.reddit import Reddit
+from chessbot import capture, database
+from chessbot.bot import handle_messages
+from chessbot.database import CommentCheckpoint, Database, NeedsInitialPost
+from chessbot.messages import IncomingComment, MsgQueue, NotifyPlayMove
+from chessbot.moves import MoveNormal
+from chessbot.ratelimit import AuthorLimiter, RequestScheduler
+from chessbot.replay import (
+    Author,
+    CapturedComment,
+    ChannelCapture,
+    ReplayReddit,
+    load,
+    replay_channel,
+)
+
+
+def listed_comment(id: str, body: str, created_utc: float) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=id,
+        fullname=f"t1_{id}",
+        parent_id="t3_a",
+        is_submitter=False,
+        author=Author("alice"),
+        body=body,
+        created_utc=created_utc,
+        subreddit=SimpleNamespace(display_name="Chess"),
+    )
+
+
+# Serves a listing of comments made while the bot was down
+class BacklogReddit(ReplayReddit):
+    async def comments(self, **kwargs: Any) -> AsyncIterator[SimpleNamespace]:
+        yield listed_comment("b", "e4", 2.0)
+        yield listed_comment("old", "d4", 0.5)
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    async def test_round_trip(self) -> None:
+        e4 = MoveNormal(chess.Move.from_uci("e2e4"), False)
+        original = ChannelCapture(
+            [e4],
+            "a",
+            [
+                ("comment", IncomingComment("b", "chess", "alice", "e5", 1.0)),
+                ("comment", IncomingComment("c", "chess", None, "Ke2 draw", 2.0)),
+                ("tick", NotifyPlayMove()),
+            ],
+            [],
+            [],
+            {},
+        )
+        seen = [CapturedComment("d", Author("bob"), "I like it", 2, False)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.jsonl")
+            capture.start(path)
+            try:
+                first = await replay_channel("chess", original, {"a": deque([seen])})
+            finally:
+                capture.stop()
+            captures, comments = load(path)
+
+        self.assertEqual(2, first.replies)
+        self.assertEqual(
+            {"comment": 2, "tick": 1},
+            {stage: times.calls for stage, times in first.stages.items()},
+        )
+
+        captured = captures["chess"]
+        self.assertEqual([e4], captured.moves)
+        self.assertEqual(original.inputs[:2], captured.inputs[:2])
+        self.assertEqual(2, len(captured.replies))
+        self.assertEqual([seen], list(comments["a"]))
+
+        second = await replay_channel("chess", captured, comments)
+        self.assertEqual(2, second.replies)
+        self.assertEqual([], second.mismatched_replies)
+        self.assertFalse(second.mismatched_titles)
+
+    async def catch_up(
+        self, directory: str, authors: AuthorLimiter | None = None
+    ) -> BacklogReddit:
+        shared = database.connect(os.path.join(directory, "bot.db"))
+        match shared.for_channel("chess"):
+            case NeedsInitialPost(db):
+                db.insert_post("a")
+                db.answer_comments([CommentCheckpoint("t1_old", 1.0)])
+            case Database():
+                raise Exception("Database should start empty")
+
+        reddit = BacklogReddit("chess", [], {})
+        queue: MsgQueue = asyncio.Queue()
+        with ThreadPoolExecutor(1) as renderer:
+            handler = asyncio.create_task(
+                handle_messages(
+                    cast(Reddit, reddit),
+                    cast(Subreddit, reddit),
+                    queue,
+                    shared,
+                    "chess",
+                    RequestScheduler(rate=1e9, burst=1e9),
+                    renderer,
+                    None,
+                    authors,
+                )
+            )
+            # Handled once the backlog has been answered
+            await queue.put(IncomingComment("c", "chess", "bob", "d4", 3.0))
+            await queue.join()
+            handler.cancel()
+            await asyncio.gather(handler, return_exceptions=True)
+        return reddit
+
+    async def test_catch_up(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.jsonl")
+            capture.start(path)
+            try:
+                reddit = await self.catch_up(directory)
+            finally:
+                capture.stop()
+            captures, comments = load(path)
+
+        self.assertEqual({"b", "c"}, set(reddit.replies))
+        report = await replay_channel("chess", captures["chess"], comments)
+        self.assertEqual(2, report.replies)
+        self.assertEqual([], report.mismatched_replies)
+
+    async def test_catch_up_flood_control(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            reddit = await self.catch_up(directory, AuthorLimiter(rate=0, burst=0))
+        self.assertEqual({"c"}, set(reddit.replies))
+
+
+if __name__ == "__main__":
+    unittest.main()
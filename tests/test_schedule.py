@@ -0,0 +1,45 @@
+import unittest
+from datetime import UTC, datetime
+from chessbot.schedule import ScheduleTimeout, ScheduleUtc
+
+
+class TestSchedule(unittest.TestCase):
+    def test_timeout(self) -> None:
+        schedule = ScheduleTimeout(60)
+        utc = datetime(2024, 1, 1, tzinfo=UTC)
+        first = schedule.next_deadline(None, 100.0, utc)
+        self.assertEqual(160.0, first)
+        # Later deadlines keep to the grid however late the last move finished
+        self.assertEqual(220.0, schedule.next_deadline(first, 175.0, utc))
+
+    def test_utc(self) -> None:
+        schedule = ScheduleUtc(4)
+        utc = datetime(2024, 1, 1, 5, 0, tzinfo=UTC)
+        first = schedule.next_deadline(None, 100.0, utc)
+        self.assertEqual(100.0 + 3600, first)
+        self.assertEqual(first + 6 * 3600, schedule.next_deadline(first, 100.0, utc))
+        late = datetime(2024, 1, 1, 23, 0, tzinfo=UTC)
+        self.assertEqual(100.0 + 3600, schedule.next_deadline(None, 100.0, late))
+
+    def test_utc_skew(self) -> None:
+        schedule = ScheduleUtc(4)
+        first = 100.0 + 3600
+        # The wall clock lags the monotonic one, so the previous deadline falls
+        # just short of the 06:00 boundary
+        behind = datetime(2024, 1, 1, 5, 59, 59, 999997, tzinfo=UTC)
+        self.assertAlmostEqual(
+            first + 6 * 3600, schedule.next_deadline(first, first, behind), places=3
+        )
+        ahead = datetime(2024, 1, 1, 6, 0, 0, 3, tzinfo=UTC)
+        self.assertAlmostEqual(
+            first + 6 * 3600, schedule.next_deadline(first, first, ahead), places=3
+        )
+        # Across midnight the next slot starts the following day
+        midnight = datetime(2024, 1, 1, 23, 59, 59, 999997, tzinfo=UTC)
+        self.assertAlmostEqual(
+            first + 6 * 3600, schedule.next_deadline(first, first, midnight), places=3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
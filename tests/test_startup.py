@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import unittest
+
+_RENDERING = ["cairosvg", "chess.svg", "chess.pgn"]
+_HEAVY = ["asyncpraw", *_RENDERING]
+
+
+def loaded_modules(code: str) -> set[str]:
+    res = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(*sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(res.stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self) -> None:
+        for code, heavy in [
+            ("import chessbot", _HEAVY),
+            ("import chessbot.moves", _HEAVY),
+            ("import chessbot.database", _HEAVY),
+            ("import chessbot.bot", _RENDERING),
+        ]:
+            modules = loaded_modules(code)
+            for module in heavy:
+                self.assertNotIn(module, modules, code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import socket
+import unittest
+from chessbot import status
+from chessbot.database import Vote
+
+
+async def get(port: int, path: str, etag: str | None = None) -> tuple[str, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = "" if etag is None else f"If-None-Match: {etag}\r\n"
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.decode(), body
+
+
+class TestStatus(unittest.IsolatedAsyncioTestCase):
+    async def test_serve(self) -> None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        status.start()
+        server = asyncio.create_task(status.serve(port))
+        try:
+            await asyncio.sleep(0.05)
+            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+            status.publish_board("chess", fen, "1. e4 *", 1, "abc")
+            status.publish_votes(
+                "chess",
+                "abc",
+                [
+                    Vote("abc", "a", "alice", "e7e5", False, None, 3),
+                    Vote("abc", "b", "bob", "e7e5", False, None, 1),
+                    Vote("abc", "c", "carol", "c7c5", False, None, 5),
+                    Vote("abc", "d", "dave", "Ke2", False, "illegal", 9),
+                ],
+            )
+
+            head, body = await get(port, "/chess/fen")
+            self.assertTrue(head.startswith("HTTP/1.1 200"))
+            self.assertEqual(fen, body.decode())
+
+            etag = next(
+                line.split(": ", 1)[1]
+                for line in head.split("\r\n")
+                if line.startswith("ETag")
+            )
+            head, body = await get(port, "/chess/fen", etag)
+            self.assertTrue(head.startswith("HTTP/1.1 304"))
+            self.assertEqual(b"", body)
+
+            _, body = await get(port, "/chess/votes")
+            self.assertEqual(
+                [["c7c5", 5, 1], ["e7e5", 3, 2]],
+                [list(s.values()) for s in json.loads(body)["standings"]],
+            )
+            _, body = await get(port, "/health")
+            self.assertEqual(1, json.loads(body)["channels"]["chess"]["ply"])
+
+            head, _ = await get(port, "/chess/board.png")
+            self.assertTrue(head.startswith("HTTP/1.1 404"))
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+            status.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from chessbot.watchdog import MemorySample, Watchdog, sample
+
+
+class TestWatchdog(unittest.IsolatedAsyncioTestCase):
+    async def test_threshold(self) -> None:
+        shed: list[str] = []
+        with tempfile.TemporaryDirectory() as directory:
+            watchdog = Watchdog(1000, directory, [lambda: shed.append("cache")])
+            self.assertIsNone(await watchdog.check(MemorySample(500, 0, 0)))
+
+            tracemalloc.start(2)
+            try:
+                path = await watchdog.check(MemorySample(1500, 0, 0))
+            finally:
+                tracemalloc.stop()
+            assert path is not None
+            report = await asyncio.to_thread(Path(path).read_text, "utf-8")
+            self.assertIn("allocation sites", report)
+            self.assertEqual(["cache"], shed)
+
+            # Stays quiet until memory falls back below the limit
+            self.assertIsNone(await watchdog.check(MemorySample(1500, 0, 0)))
+            self.assertIsNone(await watchdog.check(MemorySample(800, 0, 0)))
+            self.assertIsNotNone(await watchdog.check(MemorySample(1500, 0, 0)))
+            self.assertEqual(2, len(os.listdir(directory)))
+            self.assertEqual(2, watchdog.dumps)
+
+    def test_sample(self) -> None:
+        self.assertGreater(sample().rss, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()